@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+from models import User
+
+# In-process cache of authenticated principals, keyed by the JWT subject, so
+# get_current_user does not query users on every request. Entries are detached
+# snapshots of the User row: safe to share between requests, never flushed.
+# Commits that update or delete a user evict it in this process; AUTH_CACHE_TTL
+# bounds how long another worker can keep serving a stale role.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+def snapshot(user):
+    """Detached copy of a User with every column loaded"""
+    return User(**{column.key: getattr(user, column.key) for column in inspect(User).column_attrs})
+
+
+class PrincipalCache:
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_entries=AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # username -> (User snapshot, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(username, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user):
+        principal = snapshot(user)
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic())
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, usernames):
+        with self._lock:
+            for username in usernames:
+                self._entries.pop(username, None)
+
+
+def _changed_usernames(session):
+    usernames = set()
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            # Both the old and the new name, in case the username itself changed
+            history = inspect(obj).attrs.username.history
+            usernames.update(history.deleted)
+            usernames.add(obj.username)
+    usernames.discard(None)
+    return usernames
+
+
+def register_invalidation_listeners(cache, target):
+    """Evict users updated or deleted by a session of the given class once the commit succeeds"""
+
+    def after_flush(session, flush_context):
+        changed = _changed_usernames(session)
+        if changed:
+            session.info.setdefault("changed_usernames", set()).update(changed)
+
+    def after_commit(session):
+        changed = session.info.pop("changed_usernames", None)
+        if changed:
+            cache.invalidate(changed)
+
+    def after_rollback(session):
+        session.info.pop("changed_usernames", None)
+
+    event.listen(target, "after_flush", after_flush)
+    event.listen(target, "after_commit", after_commit)
+    event.listen(target, "after_rollback", after_rollback)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import event, select, func
+
+load_dotenv()
+
+import main
+from database import SessionLocal, engine
+from models import User, Campaign, EmailLog
+from stats import window_status_counts, timeseries_counts
+
+# Times the analytics code paths against whatever is in DATABASE_URL (load it
+# with generate_data.py first) and reports statements per call and latency
+# percentiles. Endpoint bodies are called directly, bypassing the response
+# cache, so every iteration measures the database work.
+#
+#   python bench_analytics.py --iterations 50 --users 5
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._before)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+
+def busiest_users(db, limit):
+    """Users with the most email_logs rows, where the queries have the most to do"""
+    rows = db.execute(
+        select(EmailLog.user_id).where(EmailLog.user_id.isnot(None))
+        .group_by(EmailLog.user_id).order_by(func.count().desc()).limit(limit)
+    ).all()
+    users = [db.get(User, user_id) for (user_id,) in rows]
+    # Detached, so the rollback after each call does not expire them (auth loads the user per request)
+    for user in users:
+        db.expunge(user)
+    return users
+
+
+def cases(db, user):
+    now = datetime.utcnow()
+    all_time = {"all_time": datetime.min, **main.analytics_windows()}
+    campaign_id = db.execute(
+        select(Campaign.id).where(Campaign.user_id == user.id).order_by(Campaign.sent_count.desc()).limit(1)
+    ).scalar()
+    benchmarks = {
+        "dashboard stats": lambda: main.build_dashboard_stats(db, user),
+        "analytics": lambda: main.build_comprehensive_analytics(db, user),
+        "analytics windows (email_logs scan)": lambda: window_status_counts(db, user.id, all_time, source="logs"),
+        "timeseries day x 365 (rollup)": lambda: timeseries_counts(db, user.id, "day", now - timedelta(days=365), now),
+        "timeseries day x 365 (email_logs)": lambda: timeseries_counts(
+            db, user.id, "day", now - timedelta(days=365), now, source="logs"),
+        "timeseries week x 52": lambda: timeseries_counts(db, user.id, "week", now - timedelta(weeks=52), now),
+        "timeseries hour x 168": lambda: timeseries_counts(db, user.id, "hour", now - timedelta(hours=168), now),
+    }
+    if campaign_id is not None:
+        benchmarks["campaign stats"] = lambda: main.get_campaign_stats(campaign_id, db, user)
+    return benchmarks
+
+
+def run(iterations, warmup, user_limit):
+    counter = QueryCounter()
+    db = SessionLocal()
+    try:
+        users = busiest_users(db, user_limit)
+        if not users:
+            print("No email_logs found - load data with generate_data.py first")
+            return
+        total_logs = db.execute(select(func.count()).select_from(EmailLog)).scalar()
+        print(f"{engine.dialect.name}: {total_logs} email_logs rows, {len(users)} users, {iterations} iterations each\n")
+
+        results = {}
+        for user in users:
+            for name, call in cases(db, user).items():
+                for _ in range(warmup):
+                    call()
+                    db.rollback()
+                timings = results.setdefault(name, ([], []))
+                for _ in range(iterations):
+                    before = counter.count
+                    started = time.perf_counter()
+                    call()
+                    timings[0].append((time.perf_counter() - started) * 1000)
+                    timings[1].append(counter.count - before)
+                    db.rollback()  # end the read transaction like a request would
+
+        print(f"{'case':<38} {'queries':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, (latencies, queries) in results.items():
+            print(f"{name:<38} {max(queries):>7} {percentile(latencies, 50):>9.2f} "
+                  f"{percentile(latencies, 99):>9.2f} {max(latencies):>9.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analytics queries")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--users", type=int, default=3, help="benchmark the N busiest users")
+    args = parser.parse_args()
+    run(args.iterations, args.warmup, args.users)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import gzip
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+load_dotenv()
+
+import main
+from models import User, Template
+from fast_json import FastJSONResponse, GZIP_LEVEL
+from schemas import EmailValidationResponse, TimeSeriesAnalytics
+from validation_results import ValidationRecord, validation_response
+
+# Serialization cost per endpoint, without the database: each case builds a
+# representative payload in memory, then times FastAPI's default path (the
+# route's response_model validation + jsonable serialization + stdlib json, as
+# serialize_response / JSONResponse do it) against the orjson fast path the
+# endpoint actually uses, and gzip of the body at GZIP_LEVEL.
+#
+#   python bench_serialization.py --iterations 50 --size 1000
+
+
+def route_field(path, method="GET"):
+    for route in main.app.routes:
+        if getattr(route, "path", None) == path and method in route.methods:
+            return route.response_field
+    raise LookupError(f"no route {method} {path}")
+
+
+def users(count):
+    now = datetime.utcnow()
+    return [User(id=i, username=f"user_{i}", email=f"user_{i}@example.com", role="user",
+                 hashed_password="x", created_at=now, updated_at=now) for i in range(1, count + 1)]
+
+
+def templates(count):
+    now = datetime.utcnow()
+    body = "Hello {{name}},\n\n" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 30
+    return [Template(id=f"t{i:07d}", name=f"Template {i}", subject=f"Subject {i}", body=body,
+                     category="newsletter", created_at=now, updated_at=now) for i in range(count)]
+
+
+def column_dicts(objects, fields):
+    return [{name: getattr(obj, name) for name in fields} for obj in objects]
+
+
+def validation_records(count):
+    reasons = ["Valid Domain (Major Provider)", "Invalid Format", "Possible Domain Typo", "No MX Record"]
+    return [ValidationRecord(f"person{i}@example{i % 50}.com", i % 3 != 0, i % 3 == 1, reasons[i % len(reasons)],
+                             None if i % 7 else f"person{i}@gmail.com") for i in range(count)]
+
+
+def timeseries(count):
+    start = datetime(2025, 1, 1)
+    buckets = [start + timedelta(hours=i) for i in range(count)]
+    sent = [i % 97 for i in range(count)]
+    failed = [i % 5 for i in range(count)]
+    bounced = [i % 3 for i in range(count)]
+    return TimeSeriesAnalytics(bucket="hour", campaign_id=None, buckets=buckets, sent=sent, failed=failed,
+                               bounced=bounced, total=[a + b + c for a, b, c in zip(sent, failed, bounced)])
+
+
+def cases(size):
+    loop = asyncio.new_event_loop()
+
+    def default_path(path, payload, method="GET"):
+        field = route_field(path, method)
+        return lambda: JSONResponse(loop.run_until_complete(
+            serialize_response(field=field, response_content=payload))).body
+
+    user_rows, template_rows = users(size), templates(size)
+    records = validation_records(size)
+    series = timeseries(min(size * 5, main.MAX_TIMESERIES_BUCKETS - 1))
+    # Default path of /email/validate: one pydantic model per result, re-validated by response_model
+    validation_payload = {"results": [r.as_dict() for r in records]}
+    return {
+        f"GET /admin/users ({size})": (
+            default_path("/admin/users", user_rows),
+            lambda: FastJSONResponse(column_dicts(user_rows, main.USER_LIST_FIELDS)).body,
+        ),
+        f"GET /templates ({size})": (
+            default_path("/templates", template_rows),
+            lambda: FastJSONResponse(column_dicts(template_rows, main.TEMPLATE_LIST_FIELDS)).body,
+        ),
+        f"POST /email/validate ({size})": (
+            default_path("/email/validate", EmailValidationResponse(**validation_payload), "POST"),
+            lambda: validation_response(records).body,
+        ),
+        f"GET /analytics/timeseries ({len(series.buckets)})": (
+            default_path("/analytics/timeseries", series),
+            lambda: FastJSONResponse(series).body,
+        ),
+    }
+
+
+def median_ms(call, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def run(iterations, size):
+    print(f"{iterations} iterations, median ms; gzip level {GZIP_LEVEL}\n")
+    print(f"{'endpoint':<36} {'default':>9} {'fast':>9} {'speedup':>8} {'gzip':>9} {'bytes':>9} {'gz bytes':>9}")
+    for name, (default, fast) in cases(size).items():
+        body = fast()
+        default(), fast()  # warm up
+        default_ms = median_ms(default, iterations)
+        fast_ms = median_ms(fast, iterations)
+        gzip_ms = median_ms(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), iterations)
+        compressed = len(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        print(f"{name:<36} {default_ms:>9.2f} {fast_ms:>9.2f} {default_ms / fast_ms:>7.1f}x "
+              f"{gzip_ms:>9.2f} {len(body):>9} {compressed:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark response serialization per endpoint")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--size", type=int, default=1000, help="rows / results per response")
+    args = parser.parse_args()
+    run(args.iterations, args.size)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Measures cold start: each sample is a fresh interpreter that imports main,
+# runs the startup hooks and serves one request, the way a serverless instance
+# does on its first invocation. Reports import time, startup time and time to
+# the first response (all from the start of the import), plus, with
+# --importtime, the slowest modules pulled in by `import main`.
+#
+#   python bench_startup.py --runs 10 --path / --importtime
+#   python bench_startup.py --json >> startup_history.jsonl
+
+PROBE = r"""
+import sys, time, json, warnings
+warnings.filterwarnings("ignore")
+import httpx  # the test client's transport, not part of the app's own cold start
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+client.__enter__()
+ready = time.perf_counter()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter()
+client.__exit__(None, None, None)
+print(json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (ready - started) * 1000,
+                  "first_request_ms": (first - started) * 1000, "status": status}))
+"""
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+
+def sample(path):
+    result = subprocess.run([sys.executable, "-c", PROBE, path], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"probe failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """(cumulative ms, module) of the slowest top-level imports of main, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Two spaces of indent: imported directly by main (or by the interpreter at startup)
+        if name.startswith("   ") and not name.startswith("    ") and cumulative.strip().isdigit():
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="path of the first request")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports")
+    parser.add_argument("--json", action="store_true", help="print one JSON summary line")
+    args = parser.parse_args()
+
+    samples = [sample(args.path) for _ in range(args.runs)]
+    summary = {"runs": args.runs, "path": args.path, "status": samples[-1]["status"]}
+    for key in ("import_ms", "startup_ms", "first_request_ms"):
+        values = [s[key] for s in samples]
+        summary[key] = {"p50": round(percentile(values, 50), 1), "max": round(max(values), 1)}
+
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"{args.runs} cold starts, first request GET {args.path} -> {summary['status']}\n")
+    print(f"{'phase':<20} {'p50 ms':>9} {'max ms':>9}")
+    for key, label in (("import_ms", "import main"), ("startup_ms", "startup hooks"),
+                       ("first_request_ms", "first response")):
+        print(f"{label:<20} {summary[key]['p50']:>9.1f} {summary[key]['max']:>9.1f}")
+    if args.importtime:
+        print(f"\n{'module':<40} {'ms':>9}")
+        for ms, name in slowest_imports(15):
+            print(f"{name:<40} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
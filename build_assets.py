@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+
+# Builds the frontend for production into static/dist/:
+#   - the local <script> tags of index.html bundled, in order, into one minified
+#     app.<hash>.js, and its local stylesheets into styles.<hash>.css
+#   - index.html rewritten to load those two files
+#   - .gz and .br variants of every output, served by static_assets.py according
+#     to Accept-Encoding; fingerprinted files are cached as immutable
+#
+#   python build_assets.py
+#
+# Minification uses rjsmin / rcssmin and .br files need brotli (pip install -r
+# requirements-build.txt); without them the bundle is written unminified /
+# without .br variants.
+
+SOURCE_HTML = "index.html"
+DIST_DIR = os.path.join("static", "dist")
+SCRIPT_TAG = re.compile(r'([ \t]*)<script src="(static/js/[^"]+\.js)"></script>\n?')
+STYLESHEET_TAG = re.compile(r'([ \t]*)<link rel="stylesheet" href="(static/css/[^"]+\.css)">\n?')
+FINGERPRINT_LENGTH = 12  # hex digits of the content sha256 in the file name
+
+
+def minify_js(source):
+    try:
+        import rjsmin
+    except ImportError:
+        return source
+    return rjsmin.jsmin(source)
+
+
+def minify_css(source):
+    try:
+        import rcssmin
+    except ImportError:
+        return source
+    return rcssmin.cssmin(source)
+
+
+def fingerprinted_name(stem, extension, content):
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+    return f"{stem}.{digest}.{extension}"
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def bundle(paths, minify, separator):
+    # Each file is minified on its own; ";" keeps a file without a trailing semicolon
+    # from running into the next one, as separate <script> tags never do
+    return separator.join(minify(read(path)).strip() for path in paths) + "\n"
+
+
+def replace_tags(html, pattern, paths, replacement):
+    """Swap the first matching tag for the bundle's tag and drop the rest"""
+    first = True
+
+    def substitute(match):
+        nonlocal first
+        if match.group(2) not in paths:
+            return match.group(0)
+        if first:
+            first = False
+            return match.group(1) + replacement + "\n"
+        return ""
+
+    return pattern.sub(substitute, html)
+
+
+def write_variants(path, level=9):
+    """Write path.gz and path.br; returns their sizes (None when not written)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    sizes = {"gz": None, "br": None}
+    # mtime=0 keeps the .gz byte-identical across builds of the same input
+    compressed = gzip.compress(data, compresslevel=level, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(compressed)
+        sizes["gz"] = len(compressed)
+    try:
+        import brotli
+    except ImportError:
+        return sizes
+    compressed = brotli.compress(data, quality=11)
+    if len(compressed) < len(data):
+        with open(path + ".br", "wb") as f:
+            f.write(compressed)
+        sizes["br"] = len(compressed)
+    return sizes
+
+
+def build(source_html=SOURCE_HTML, dist_dir=DIST_DIR):
+    html = read(source_html)
+    scripts = [m.group(2) for m in SCRIPT_TAG.finditer(html)]
+    stylesheets = [m.group(2) for m in STYLESHEET_TAG.finditer(html)]
+
+    # Start clean so files of earlier builds (old fingerprints) are not served forever
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    outputs = {}
+    sources = {}
+    if scripts:
+        js = bundle(scripts, minify_js, ";\n")
+        outputs["app.js"] = (fingerprinted_name("app", "js", js), js)
+        sources["app.js"] = scripts
+    if stylesheets:
+        css = bundle(stylesheets, minify_css, "\n")
+        outputs["styles.css"] = (fingerprinted_name("styles", "css", css), css)
+        sources["styles.css"] = stylesheets
+
+    url_prefix = dist_dir.replace(os.sep, "/")
+    if "app.js" in outputs:
+        html = replace_tags(html, SCRIPT_TAG, scripts, f'<script src="{url_prefix}/{outputs["app.js"][0]}"></script>')
+    if "styles.css" in outputs:
+        html = replace_tags(html, STYLESHEET_TAG, stylesheets,
+                            f'<link rel="stylesheet" href="{url_prefix}/{outputs["styles.css"][0]}">')
+    outputs["index.html"] = ("index.html", html)
+    sources["index.html"] = [source_html]
+
+    manifest = {}
+    print(f"{'file':<28} {'source':>9} {'built':>9} {'gzip':>9} {'brotli':>9}")
+    for logical, (name, content) in outputs.items():
+        path = os.path.join(dist_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        sizes = write_variants(path)
+        source_size = sum(os.path.getsize(p) for p in sources[logical])
+        built_size = os.path.getsize(path)
+        manifest[logical] = name
+        print(f"{name:<28} {source_size:>9} {built_size:>9} {sizes['gz'] or '-':>9} {sizes['br'] or '-':>9}")
+
+    with open(os.path.join(dist_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bundle, minify, fingerprint and precompress the frontend")
+    parser.add_argument("--html", default=SOURCE_HTML)
+    parser.add_argument("--out", default=DIST_DIR)
+    args = parser.parse_args()
+    build(args.html, args.out)
@@ -1,6 +1,9 @@
 import os
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,11 +15,75 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("No DATABASE_URL found in environment variables")
 
-# The connect_args are specific to SQLite and not needed for PostgreSQL
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Optional read replica for analytics and list endpoints; writes always go to DATABASE_URL
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Connection pool, per worker process. Size it so workers x (size + overflow)
+# stays below the server's max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; reconnect before server/LB idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Behind PgBouncer in transaction mode: let PgBouncer do the pooling (NullPool)
+# and turn off asyncpg's prepared statement cache, which transaction pooling breaks
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+
+def engine_options(url, is_async=False):
+    """create_engine keyword arguments for a URL, from the DB_POOL_* settings"""
+    if url.startswith("sqlite"):
+        return {}  # SQLite's default pool is per-file and does not take these settings
+    if DB_PGBOUNCER:
+        options = {"poolclass": NullPool}
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Reads that tolerate replication lag use this; without a replica it is the primary
+read_engine = create_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)) if DATABASE_REPLICA_URL else engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(url):
+    """Same database through an asyncio driver: asyncpg for PostgreSQL, aiosqlite for SQLite"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver:
+        # Also swaps an explicit sync driver (postgresql+psycopg2://, sqlite+pysqlite://)
+        url = url.set(drivername=f"{url.get_backend_name()}+{driver}")
+    return url.render_as_string(hide_password=False)
+
+
+# Async engine for the async def endpoints, so their queries do not block the event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+
+
+class AsyncORMSession(Session):
+    """Sync Session underneath AsyncSessionLocal; ORM event listeners (rollups, caches) attach here"""
+
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, sync_session_class=AsyncORMSession
+)
+
 
 def get_db():
 
@@ -28,4 +95,18 @@ def get_db():
 
     finally:
 
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Session on the read replica (or the primary); for read-only endpoints only"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
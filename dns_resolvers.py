@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+
+# dnspython is imported on the first lookup rather than here, keeping it off
+# the cold-start path of processes that never validate an address.
+
+# Comma separated list of resolvers ("1.1.1.1,8.8.8.8" or "127.0.0.1:5353").
+# Empty means "use the system resolver only", which keeps the old behaviour.
+DNS_RESOLVERS = [r.strip() for r in os.getenv("DNS_RESOLVERS", "").split(",") if r.strip()]
+DNS_QUERY_TIMEOUT = float(os.getenv("DNS_QUERY_TIMEOUT", "3.0"))  # seconds, per query
+DNS_HEDGE_MIN_DELAY = float(os.getenv("DNS_HEDGE_MIN_DELAY", "0.05"))
+DNS_HEDGE_MAX_DELAY = float(os.getenv("DNS_HEDGE_MAX_DELAY", "1.0"))
+
+
+class ResolverStats:
+    """Latency and outcome counters for a single upstream resolver"""
+
+    def __init__(self, name, window=200):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.answers = 0
+        self.negative = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, outcome):
+        with self._lock:
+            self.latencies.append(latency)
+            if outcome == "answer":
+                self.answers += 1
+            elif outcome == "negative":
+                self.negative += 1
+            else:
+                self.errors += 1
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def error_rate(self):
+        with self._lock:
+            total = self.answers + self.negative + self.errors
+            return self.errors / total if total else 0.0
+
+    def as_dict(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "resolver": self.name,
+            "answers": self.answers,
+            "negative": self.negative,
+            "errors": self.errors,
+            "hedges_won": self.hedges_won,
+            "error_rate": round(self.error_rate(), 4),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def build_resolver(address, timeout=DNS_QUERY_TIMEOUT):
+    """Create a dnspython resolver pinned to one nameserver ("ip" or "ip:port")"""
+    import dns.resolver
+
+    if address == "system":
+        resolver = dns.resolver.Resolver()
+    else:
+        host, _, port = address.partition(":")
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.nameservers = [host]
+        if port:
+            resolver.port = int(port)
+    resolver.timeout = timeout
+    resolver.lifetime = timeout
+    return resolver
+
+
+class HedgedResolver:
+    """MX lookups against several resolvers with hedged (backup) queries.
+
+    The healthiest resolver is queried first. If it has not answered after a
+    delay derived from its own p95 latency, the same query is sent to the next
+    resolver and whichever answers first wins.
+    """
+
+    def __init__(self, addresses=None, executor=None, timeout=DNS_QUERY_TIMEOUT,
+                 min_delay=DNS_HEDGE_MIN_DELAY, max_delay=DNS_HEDGE_MAX_DELAY):
+        addresses = addresses or ["system"]
+        self.executor = executor
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.addresses = addresses
+        self.timeout = timeout
+        self.resolver_stats = [ResolverStats(a) for a in addresses]
+        self._resolvers = None
+        self.hedged_queries = 0
+
+    @property
+    def resolvers(self):
+        """(dnspython resolver, stats) pairs, built on first use"""
+        if self._resolvers is None:
+            self._resolvers = [(build_resolver(a, self.timeout), stats)
+                               for a, stats in zip(self.addresses, self.resolver_stats)]
+        return self._resolvers
+
+    def _ranked(self):
+        """Resolvers ordered by error rate, then by median latency"""
+        def score(item):
+            stats = item[1]
+            p50 = stats.percentile(50)
+            return (round(stats.error_rate(), 1), p50 if p50 is not None else 0.0)
+        return sorted(self.resolvers, key=score)
+
+    def hedge_delay(self, stats):
+        p95 = stats.percentile(95)
+        if p95 is None:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, p95))
+
+    def _query(self, resolver, stats, domain):
+        """Blocking MX query; returns the exchange host or None for NXDOMAIN/no answer"""
+        import dns.resolver
+
+        started = time.perf_counter()
+        try:
+            answer = resolver.resolve(domain, "MX")
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):  # a definitive "no MX", not a resolver problem
+            stats.record(time.perf_counter() - started, "negative")
+            return None
+        except Exception:
+            stats.record(time.perf_counter() - started, "error")
+            raise
+        stats.record(time.perf_counter() - started, "answer")
+        # Lowest preference value is the primary mail exchanger
+        best = min(answer, key=lambda r: r.preference)
+        return str(best.exchange)
+
+    async def resolve_mx(self, domain):
+        """Return the preferred MX host for a domain, or None if it has none.
+
+        Raises the last error if every resolver failed.
+        """
+        loop = asyncio.get_running_loop()
+        ranked = self._ranked()
+        pending = set()
+        owners = {}
+        last_error = None
+
+        def launch(resolver, stats):
+            task = loop.run_in_executor(self.executor, self._query, resolver, stats, domain)
+            owners[task] = stats
+            pending.add(task)
+            return task
+
+        primary = launch(*ranked[0])
+        latest_stats = ranked[0][1]
+        next_index = 1
+        while pending:
+            delay = self.hedge_delay(latest_stats) if next_index < len(ranked) else None
+            done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    if task is not primary:
+                        owners[task].hedges_won += 1
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                last_error = task.exception()
+
+            # Primary is slow or failed: fire the query at the next resolver
+            if next_index < len(ranked) and (not done or not pending):
+                if pending:
+                    self.hedged_queries += 1
+                launch(*ranked[next_index])
+                latest_stats = ranked[next_index][1]
+                next_index += 1
+
+        if last_error is None:
+            import dns.exception
+            last_error = dns.exception.Timeout()
+        raise last_error
+
+    def stats(self):
+        return {
+            "hedged_queries": self.hedged_queries,
+            "resolvers": [stats.as_dict() for stats in self.resolver_stats],
+        }
@@ -0,0 +1,81 @@
+import os
+import gzip
+import json
+import time
+import tempfile
+
+# Snapshot of the validation domain cache (MX host + catch-all flag per domain).
+# Written on shutdown and periodically so a fresh worker starts with a warm cache.
+DNS_SNAPSHOT_PATH = os.getenv("DNS_SNAPSHOT_PATH", ".dns_snapshot.json.gz")
+DNS_SNAPSHOT_MAX_DOMAINS = int(os.getenv("DNS_SNAPSHOT_MAX_DOMAINS", "5000"))
+DNS_SNAPSHOT_INTERVAL = int(os.getenv("DNS_SNAPSHOT_INTERVAL", "300"))  # seconds
+
+SNAPSHOT_VERSION = 1
+
+
+def _to_wall_clock(monotonic_ts):
+    """Convert a monotonic cache timestamp into a unix timestamp"""
+    return time.time() - (time.monotonic() - monotonic_ts)
+
+
+def _to_monotonic(wall_ts):
+    """Convert a unix timestamp back into the monotonic clock used by the cache"""
+    return time.monotonic() - (time.time() - wall_ts)
+
+
+def save_snapshot(path, dns_cache, catch_all_cache, domain_hits, max_domains=DNS_SNAPSHOT_MAX_DOMAINS):
+    """Write the most frequently seen domains to a compact gzipped snapshot"""
+    domains = set(dns_cache) | set(catch_all_cache)
+    top_domains = sorted(domains, key=lambda d: domain_hits.get(d, 0), reverse=True)[:max_domains]
+
+    # Compact row format: [domain, mx_host, mx_cached_at, catch_all, catch_all_cached_at, hits]
+    rows = []
+    for domain in top_domains:
+        mx_host, mx_ts = dns_cache.get(domain, (None, None))
+        catch_all, ca_ts = catch_all_cache.get(domain, (None, None))
+        rows.append([
+            domain,
+            mx_host,
+            round(_to_wall_clock(mx_ts)) if mx_ts is not None else None,
+            catch_all,
+            round(_to_wall_clock(ca_ts)) if ca_ts is not None else None,
+            domain_hits.get(domain, 0),
+        ])
+
+    # Write to a temp file of our own and rename, so a crash or another worker saving
+    # at the same time never leaves a truncated or interleaved snapshot behind
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "rows": rows}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(rows)
+
+
+def load_snapshot(path, ttl):
+    """Bulk-load a snapshot, dropping entries older than ttl seconds"""
+    if not path or not os.path.exists(path):
+        return {}, {}, {}
+
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            return {}, {}, {}
+
+        now = time.time()
+        dns_entries, catch_all_entries, hits = {}, {}, {}
+        for domain, mx_host, mx_at, catch_all, ca_at, domain_hits in data.get("rows", []):
+            if mx_at is not None and now - mx_at < ttl:
+                dns_entries[domain] = (mx_host, _to_monotonic(mx_at))
+            if ca_at is not None and now - ca_at < ttl:
+                catch_all_entries[domain] = (catch_all, _to_monotonic(ca_at))
+            hits[domain] = domain_hits
+    except (EOFError, ValueError, TypeError, AttributeError, gzip.BadGzipFile) as e:
+        # Truncated or corrupt file: start with a cold cache, the next save replaces it
+        print(f"Ignoring unreadable DNS snapshot {path}: {e}")
+        return {}, {}, {}
+    return dns_entries, catch_all_entries, hits
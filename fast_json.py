@@ -0,0 +1,81 @@
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional speedup - fall back to the stdlib encoder
+    orjson = None
+    import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+
+from static_assets import accepted_encodings
+
+# Opt-in fast path for large JSON responses. FastAPI's default path validates
+# the returned value against response_model again, runs jsonable_encoder over
+# every field and encodes with the stdlib json module. Endpoints whose data
+# comes straight from our own tables or models can return FastJSONResponse
+# instead: FastAPI then skips response_model validation, and the body is encoded
+# by orjson, which handles dicts, lists, datetimes and pydantic models natively
+# (the response_model stays on the route for the OpenAPI schema).
+#
+# Compression is done for every response by CompressingMiddleware in main.py.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))  # bytes; smaller bodies are not worth compressing
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))  # 1-9; 9 costs several times the CPU for a few % less
+# Bodies that are compressed already (gzip exports, archives, images, fonts) and would only burn CPU
+COMPRESSED_CONTENT_TYPES = (
+    "application/gzip", "application/x-gzip", "application/zip",
+    "image/png", "image/jpeg", "image/gif", "image/webp", "font/woff",
+)
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        dump = getattr(obj, "model_dump", None) or obj.dict  # pydantic v2 / v1
+        return dump()
+    return jsonable_encoder(obj)
+
+
+def dumps(content):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _SkipCompressedResponder(GZipResponder):
+    async def send_with_compression(self, message):
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_compression(message)
+            # Same pass-through path Starlette uses for text/event-stream
+            self.content_type_is_excluded = self.content_type_is_excluded or content_type.startswith(
+                COMPRESSED_CONTENT_TYPES)
+            return
+        await super().send_with_compression(message)
+
+
+class CompressingMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves COMPRESSED_CONTENT_TYPES alone and honours gzip;q=0"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if "gzip" in accepted_encodings(Headers(scope=scope).get("accept-encoding", "")):
+            responder = _SkipCompressedResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)  # still adds Vary: Accept-Encoding
+        await responder(scope, receive, send)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        if isinstance(content, bytes):
+            return content  # already encoded, e.g. streamed in chunks
+        return dumps(content)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+import io
+import csv
+import random
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from sqlalchemy import select, text
+
+load_dotenv()
+
+from database import engine
+from models import Base, User, Template, Campaign, EmailLog
+from rollups import rebuild_rollups, rebuild_campaign_counters
+from partitions import is_partitioned, partition_months, create_partition, month_start, add_months
+
+# Bulk-loads synthetic users, campaigns and email_logs so the analytics queries
+# can be measured at realistic sizes (see bench_analytics.py). Rows are written
+# with COPY on PostgreSQL and batched executemany on SQLite, bypassing the ORM;
+# the rollup table and campaign counters are rebuilt once at the end.
+#
+#   python generate_data.py --users 200 --logs 10000000 --days 365
+#
+# Generated users are bench_user_<n> with password "bench123".
+
+STATUS_WEIGHTS = {"sent": 0.92, "bounced": 0.05, "failed": 0.03}
+# Relative send volume per UTC hour: quiet nights, busy office hours
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 8, 10, 10, 9, 8, 9, 10, 10, 9, 7, 5, 4, 3, 2, 2, 1]
+RECIPIENT_DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "hotmail.com", "icloud.com",
+                     "protonmail.com", "company.com", "example.org", "business.net"]
+LOG_COLUMNS = ("user_id", "campaign_id", "recipient_email", "status", "sent_at", "error_message")
+BENCH_TEMPLATE_ID = "bench-template"
+
+
+def create_users(conn, count, password_hash):
+    start = conn.execute(select(User.id).order_by(User.id.desc()).limit(1)).scalar() or 0
+    rows = [{
+        "username": f"bench_user_{start + i}",
+        "email": f"bench_user_{start + i}@example.com",
+        "hashed_password": password_hash,
+        "role": "user",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    } for i in range(1, count + 1)]
+    conn.execute(User.__table__.insert(), rows)
+    return [r[0] for r in conn.execute(select(User.id).where(User.username.in_([r["username"] for r in rows])))]
+
+
+def ensure_template(conn):
+    if conn.execute(select(Template.id).where(Template.id == BENCH_TEMPLATE_ID)).first() is None:
+        conn.execute(Template.__table__.insert().values(
+            id=BENCH_TEMPLATE_ID, name="Benchmark newsletter", subject="Hello", body="Synthetic campaign body",
+            category="newsletter", created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+        ))
+
+
+def create_campaigns(conn, user_ids, per_user, days):
+    now = datetime.utcnow()
+    ensure_template(conn)
+    rows = []
+    for user_id in user_ids:
+        for n in range(random.randint(max(1, per_user // 2), per_user * 3 // 2)):
+            rows.append({
+                "user_id": user_id,
+                "name": f"Campaign {n + 1}",
+                "template_id": BENCH_TEMPLATE_ID,
+                "sender_email": f"news@user{user_id}.example.com",
+                "created_at": now - timedelta(days=random.uniform(0, days)),
+                "status": "completed",
+            })
+    conn.execute(Campaign.__table__.insert(), rows)
+    result = conn.execute(select(Campaign.id, Campaign.user_id).where(Campaign.user_id.in_(user_ids)))
+    campaigns = {}
+    for campaign_id, user_id in result:
+        campaigns.setdefault(user_id, []).append(campaign_id)
+    return campaigns
+
+
+def iter_logs(count, user_ids, campaigns, days, campaign_share):
+    """Synthetic email_logs rows: a few heavy senders, more volume in recent weeks and office hours"""
+    now = datetime.utcnow()
+    # Pareto weights so a handful of users send most of the mail, like real tenants
+    user_weights = [random.paretovariate(1.2) for _ in user_ids]
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    batch = 10000
+    for offset in range(0, count, batch):
+        n = min(batch, count - offset)
+        senders = random.choices(user_ids, user_weights, k=n)
+        picked_statuses = random.choices(statuses, status_weights, k=n)
+        hours = random.choices(range(24), HOUR_WEIGHTS, k=n)
+        for user_id, status, hour in zip(senders, picked_statuses, hours):
+            # Triangular with mode 0: volume grows towards the present
+            day = now - timedelta(days=int(random.triangular(0, days, 0)))
+            sent_at = day.replace(hour=hour, minute=random.randrange(60), second=random.randrange(60),
+                                  microsecond=0)
+            if sent_at > now:
+                sent_at -= timedelta(days=1)
+            own = campaigns.get(user_id)
+            campaign_id = random.choice(own) if own and random.random() < campaign_share else None
+            recipient = f"r{random.randrange(10_000_000)}@{random.choice(RECIPIENT_DOMAINS)}"
+            error = "550 Mailbox unavailable" if status == "failed" else None
+            yield (user_id, campaign_id, recipient, status, sent_at, error)
+
+
+def ensure_month_partitions(conn, days):
+    """Partitions for every generated month, so rows do not pile up in the DEFAULT partition"""
+    if not is_partitioned(conn):
+        return
+    existing = set(partition_months(conn))
+    month = month_start(datetime.utcnow() - timedelta(days=days + 1))
+    while month <= month_start(datetime.utcnow()):
+        if month not in existing:
+            create_partition(conn, month)
+        month = add_months(month, 1)
+
+
+def load_logs_postgresql(rows, batch_size):
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        sql = f"COPY email_logs ({', '.join(LOG_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        loaded = 0
+        while True:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            chunk = 0
+            for row in rows:
+                writer.writerow(["" if v is None else v for v in row])
+                chunk += 1
+                if chunk >= batch_size:
+                    break
+            if not chunk:
+                break
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            raw.commit()
+            loaded += chunk
+            print(f"  {loaded} rows", end="\r")
+        print()
+    finally:
+        raw.close()
+
+
+def load_logs_generic(rows, batch_size):
+    insert = EmailLog.__table__.insert()
+    loaded = 0
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("PRAGMA synchronous = OFF"))
+        batch = []
+        for row in rows:
+            batch.append(dict(zip(LOG_COLUMNS, row)))
+            if len(batch) >= batch_size:
+                conn.execute(insert, batch)
+                loaded += len(batch)
+                batch = []
+                print(f"  {loaded} rows", end="\r")
+        if batch:
+            conn.execute(insert, batch)
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load synthetic users, campaigns and email logs")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--campaigns-per-user", type=int, default=20)
+    parser.add_argument("--logs", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365, help="spread sent_at over this many days")
+    parser.add_argument("--campaign-share", type=float, default=0.7, help="fraction of emails sent for a campaign")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    Base.metadata.create_all(bind=engine)
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash("bench123")
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        user_ids = create_users(conn, args.users, password_hash)
+        campaigns = create_campaigns(conn, user_ids, args.campaigns_per_user, args.days)
+        ensure_month_partitions(conn, args.days)
+    print(f"Created {len(user_ids)} users and {sum(map(len, campaigns.values()))} campaigns")
+
+    print(f"Loading {args.logs} email logs...")
+    rows = iter_logs(args.logs, user_ids, campaigns, args.days, args.campaign_share)
+    if engine.dialect.name == "postgresql":
+        load_logs_postgresql(rows, args.batch_size)
+    else:
+        load_logs_generic(rows, args.batch_size)
+
+    print("Rebuilding email_stats_rollup and campaign counters...")
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+        rebuild_campaign_counters(conn)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE email_logs"))
+            conn.execute(text("ANALYZE email_stats_rollup"))
+        else:
+            conn.execute(text("ANALYZE"))
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import time
+import heapq
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict
+
+# Greylisting servers answer RCPT with a 4xx until the sender retries after a
+# delay. Instead of failing those addresses, they are queued here and re-probed
+# in batches (grouped per MX host) once the greylist window has passed.
+GREYLIST_RETRY_DELAY = int(os.getenv("GREYLIST_RETRY_DELAY", "300"))  # seconds
+GREYLIST_MAX_ATTEMPTS = int(os.getenv("GREYLIST_MAX_ATTEMPTS", "3"))
+GREYLIST_BATCH_SIZE = int(os.getenv("GREYLIST_BATCH_SIZE", "50"))
+GREYLIST_MAX_RESOLVED = int(os.getenv("GREYLIST_MAX_RESOLVED", "100000"))
+GREYLIST_RESULT_TTL = int(os.getenv("GREYLIST_RESULT_TTL", "86400"))  # seconds a re-check verdict is reused
+
+
+class RecheckScheduler:
+    """Delayed re-check queue for greylisted (4xx) SMTP answers.
+
+    ``probe(mail_server, domain, emails)`` is called from a worker thread and
+    must return ``{email: {"status": ..., "message": ...}}`` using the same
+    statuses as ``check_smtp_advanced``.
+    """
+
+    def __init__(self, probe, delay=GREYLIST_RETRY_DELAY, max_attempts=GREYLIST_MAX_ATTEMPTS,
+                 batch_size=GREYLIST_BATCH_SIZE, max_resolved=GREYLIST_MAX_RESOLVED, result_ttl=GREYLIST_RESULT_TTL):
+        self.probe = probe
+        self.delay = delay
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.max_resolved = max_resolved
+        self.result_ttl = result_ttl
+        self._heap = []  # (due_at, seq, email)
+        self._pending = {}  # email -> (domain, mail_server, attempt)
+        self._resolved = OrderedDict()  # email -> {"status", "message", "resolved_at"}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def schedule(self, email, domain, mail_server, attempt=1):
+        """Queue an address for re-checking after the greylist window"""
+        with self._lock:
+            if email in self._pending and attempt == 1:
+                return  # Already queued by an earlier validation request
+            self._resolved.pop(email, None)
+            self._pending[email] = (domain, mail_server, attempt)
+            self._seq += 1
+            # Back off linearly so repeatedly greylisted servers are not hammered
+            heapq.heappush(self._heap, (time.monotonic() + self.delay * attempt, self._seq, email))
+
+    def get_result(self, email):
+        """Return the resolved re-check result for an address, if any and not expired"""
+        with self._lock:
+            self._expire_resolved()
+            return self._resolved.get(email)
+
+    def _expire_resolved(self):
+        # _resolved is kept in resolve order, so expired entries are all at the front
+        cutoff = time.time() - self.result_ttl
+        while self._resolved and next(iter(self._resolved.values()))["resolved_at"] < cutoff:
+            self._resolved.popitem(last=False)
+
+    def is_pending(self, email):
+        with self._lock:
+            return email in self._pending
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def pop_due(self, now=None):
+        """Pop every due entry, grouped into per-MX batches"""
+        now = time.monotonic() if now is None else now
+        batches = defaultdict(list)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, email = heapq.heappop(self._heap)
+                entry = self._pending.get(email)
+                if entry is None:
+                    continue
+                domain, mail_server, attempt = entry
+                batches[(mail_server, domain)].append((email, attempt))
+
+        result = []
+        for (mail_server, domain), entries in batches.items():
+            for i in range(0, len(entries), self.batch_size):
+                result.append((mail_server, domain, entries[i:i + self.batch_size]))
+        return result
+
+    def resolve(self, email, status, message):
+        with self._lock:
+            self._pending.pop(email, None)
+            self._resolved[email] = {"status": status, "message": message, "resolved_at": time.time()}
+            self._resolved.move_to_end(email)
+            self._expire_resolved()
+            while len(self._resolved) > self.max_resolved:
+                self._resolved.popitem(last=False)
+
+    def run_batch(self, mail_server, domain, entries):
+        """Re-probe one batch and record the outcome of every address in it"""
+        emails = [email for email, _ in entries]
+        try:
+            outcomes = self.probe(mail_server, domain, emails)
+        except Exception as e:
+            outcomes = {email: {"status": "smtp_unreachable", "message": f"SMTP unreachable: {e}"} for email in emails}
+
+        for email, attempt in entries:
+            outcome = outcomes.get(email, {"status": "smtp_unreachable", "message": "No response"})
+            if outcome["status"] == "greylisted" and attempt < self.max_attempts:
+                with self._lock:
+                    self._pending.pop(email, None)
+                self.schedule(email, domain, mail_server, attempt + 1)
+            elif outcome["status"] == "greylisted":
+                # Out of attempts: nothing more is scheduled, so do not report a pending re-check
+                self.resolve(email, "smtp_unreachable",
+                             f"Still greylisted after {attempt} attempts: {outcome['message']}")
+            else:
+                self.resolve(email, outcome["status"], outcome["message"])
+
+    def next_due_in(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    async def run(self, poll_interval=5.0):
+        """Background loop: sleep until the next entry is due, then retry due batches"""
+        while True:
+            wait = self.next_due_in()
+            await asyncio.sleep(poll_interval if wait is None else min(wait, poll_interval))
+            batches = self.pop_due()
+            if batches:
+                await asyncio.gather(*[
+                    asyncio.to_thread(self.run_batch, mail_server, domain, entries)
+                    for mail_server, domain, entries in batches
+                ])
@@ -0,0 +1,75 @@
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select, or_
+
+from models import Campaign, EmailLog
+
+# Streaming export of email_logs. Rows are read through a server-side cursor
+# (stream_results + yield_per) on a dedicated connection and encoded batch by
+# batch, so memory stays flat regardless of how many rows are exported.
+
+EXPORT_BATCH_SIZE = 1000  # rows fetched and encoded per chunk
+EXPORT_COLUMNS = ("id", "sent_at", "recipient_email", "status", "campaign_id", "user_id", "error_message")
+
+email_logs = EmailLog.__table__
+
+
+def export_query(user_id, start=None, end=None, campaign_id=None):
+    """The user's email_logs rows (own sends and their campaigns' emails) in sent_at order"""
+    own_campaigns = select(Campaign.id).where(Campaign.user_id == user_id)
+    query = select(*[email_logs.c[name] for name in EXPORT_COLUMNS]).where(
+        or_(email_logs.c.user_id == user_id, email_logs.c.campaign_id.in_(own_campaigns))
+    )
+    if start is not None:
+        query = query.where(email_logs.c.sent_at >= start)
+    if end is not None:
+        query = query.where(email_logs.c.sent_at < end)
+    if campaign_id is not None:
+        query = query.where(email_logs.c.campaign_id == campaign_id)
+    return query.order_by(email_logs.c.sent_at, email_logs.c.id)
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_rows(engine, query, batch_size=EXPORT_BATCH_SIZE):
+    """Batches of rows from a server-side cursor; the connection lives as long as the iteration"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for batch in result.partitions():
+            yield batch
+
+
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows([[_value(v) for v in row] for row in batch])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(batches):
+    for batch in batches:
+        lines = [json.dumps(dict(zip(EXPORT_COLUMNS, map(_value, row))), separators=(",", ":")) for row in batch]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a byte stream on the fly into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
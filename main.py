@@ -1,7 +1,6 @@
 import os
 import json
-import dns.resolver
-import smtplib
+import hmac
 import asyncio
 from dotenv import load_dotenv
 import uuid
@@ -27,35 +26,51 @@ if not SENDGRID_API_KEY:
 # Email validation regex pattern
 EMAIL_VALIDATION_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, select
-from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import sendgrid
-from sendgrid.helpers.mail import Mail
-from authlib.integrations.starlette_client import OAuth
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.config import Config
-from starlette.responses import RedirectResponse
-import uvicorn
-import requests
+from starlette.responses import Response, RedirectResponse, StreamingResponse, JSONResponse
 import re
+# jose, sendgrid, authlib, requests, smtplib and dnspython are imported where they are first
+# used: together they were most of the import time of this module, which every cold start pays.
 
-from database import SessionLocal, engine
+from database import SessionLocal, engine, read_engine, async_engine, AsyncORMSession, get_async_db, get_read_db
 from typing import List
-from models import Base, User as DBUser, Template, Campaign, EmailLog
+from models import User as DBUser, Template, Campaign, EmailLog, EmailSuppression
+from rollups import register_rollup_listeners
+from stats import window_status_counts, campaign_count_column, timeseries_counts, BUCKETS, MAX_TIMESERIES_BUCKETS
+from log_export import export_query, iter_rows, iter_csv, iter_ndjson, gzip_stream
+from webhook_events import (
+    EventIngestor, verify_signature, valid_event, SENDGRID_WEBHOOK_PUBLIC_KEY, SIGNATURE_HEADER, TIMESTAMP_HEADER,
+)
+from metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_TOKEN, MetricsMiddleware, Gauge, CounterFunction,
+    monitor_loop_lag,
+    DNS_CACHE_LOOKUPS, SMTP_PROBE_LATENCY, SMTP_PROBE_OUTCOMES, SENDGRID_LATENCY, SENDGRID_RESPONSES,
+)
+from fast_json import FastJSONResponse, CompressingMiddleware, GZIP_MIN_SIZE, GZIP_LEVEL
+from pagination import parse_fields, keyset_page, page_headers, LIST_PAGE_SIZE, LIST_PAGE_SIZE_MAX, NEXT_CURSOR_HEADER
+from password_pool import PasswordHasher, PasswordPoolBusy
+from auth_cache import PrincipalCache, register_invalidation_listeners as register_principal_invalidation
+from template_cache import (
+    TEMPLATES, new_template_cache, list_key as template_list_key, item_key as template_item_key,
+    register_invalidation_listeners as register_template_invalidation,
+)
+from response_cache import UserResponseCache, register_invalidation_listeners, cached_response
 from schemas import (
     EmailRequest, User as UserSchema, UserUpdate, AdminUserCreate, AdminUserUpdate, UserPasswordUpdate,
     Template as TemplateSchema, TemplateCreate, TemplateUpdate,
     Campaign as CampaignSchema, CampaignCreate,
     EmailLog as EmailLogSchema, EmailLogCreate,
-    DashboardStats, EmailStats, EmailValidationRequest, EmailValidationResponse, EmailValidationResult, EmailGenerationRequest, EmailGenerationResponse,
-    ComprehensiveAnalytics, EmailStatusStats, DeliveryStats, TimeBasedStats
+    DashboardStats, EmailStats, EmailValidationRequest, EmailValidationResponse, EmailGenerationRequest, EmailGenerationResponse,
+    ComprehensiveAnalytics, TimeSeriesAnalytics, CampaignStats, EmailStatusStats, DeliveryStats, TimeBasedStats
 )
 
 app = FastAPI()
@@ -68,6 +83,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["Authorization", "Content-Type"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Link"],
 )
 
 app.add_middleware(
@@ -75,31 +91,73 @@ app.add_middleware(
     secret_key=JWT_SECRET
 )
 
-Base.metadata.create_all(bind=engine)
+# Compress JSON/HTML/JS bodies of GZIP_MIN_SIZE bytes or more; responses that already carry a
+# Content-Encoding (precompressed static assets) or are compressed formats (the gzip export) pass through
+app.add_middleware(CompressingMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
+# Outermost, so request latency includes compression and every other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Schema creation runs on startup, not at import. Serverless deployments set
+# DB_INIT_ON_STARTUP=false and run `python migrate_db.py` at deploy time instead.
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true"
+
+@app.on_event("startup")
+def init_database():
+    if DB_INIT_ON_STARTUP:
+        from migrate_db import create_schema
+        # Partition upkeep belongs to migrate_db.py / partitions.py; a failure there must not stop the app
+        create_schema(engine, strict_partitions=False)
+
+# Keep email_stats_rollup in step with every EmailLog write
+register_rollup_listeners(SessionLocal)
+register_rollup_listeners(AsyncORMSession)
+
+# Rendered /dashboard/stats and /analytics bodies, invalidated on commit of the user's logs/campaigns.
+# With a read replica the body may be computed from slightly lagging data; the TTL bounds that too.
+analytics_cache = UserResponseCache()
+register_invalidation_listeners(analytics_cache, SessionLocal)
+register_invalidation_listeners(analytics_cache, AsyncORMSession)
+
+# Rendered /templates pages and single templates, invalidated on commit of any template change.
+# Misses read the primary (get_db), so a replica lagging behind an edit cannot be cached for the TTL.
+template_cache = new_template_cache()
+register_template_invalidation(template_cache, SessionLocal)
+register_template_invalidation(template_cache, AsyncORMSession)
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs on a bounded worker pool so it never blocks the event loop
+password_hasher = PasswordHasher(pwd_context)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# OAuth config for Google
+# OAuth config for Google, built on the first Google login
 config = Config('.env')
-oauth = OAuth(config)
-
-if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
-    oauth.register(
-        name='google',
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-        client_kwargs={
-            'scope': 'openid email profile',
-            'redirect_uri': 'http://localhost:8000/auth/google/callback'
-        },
-    )
-else:
+_oauth = None
+
+def get_oauth():
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.starlette_client import OAuth
+
+        oauth = OAuth(config)
+        oauth.register(
+            name='google',
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET,
+            server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+            client_kwargs={
+                'scope': 'openid email profile',
+                'redirect_uri': 'http://localhost:8000/auth/google/callback'
+            },
+        )
+        _oauth = oauth
+    return _oauth
+
+if not (GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET):
     print("Warning: Google OAuth not configured.")
 
 # DB dependency
@@ -110,12 +168,17 @@ def get_db():
     finally:
         db.close()
 
-# Password utils
+# Password utils (sync, for def endpoints; async routes await password_hasher directly)
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_sync(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_hasher.hash_sync(password)
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy(request: Request, exc: PasswordPoolBusy):
+    return JSONResponse(status_code=503, content={"detail": "Too many sign-in attempts, please retry shortly"},
+                        headers={"Retry-After": "1"})
 
 # User utils
 def get_user(db: Session, username: str):
@@ -124,11 +187,19 @@ def get_user(db: Session, username: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(DBUser).filter(DBUser.email == email).first()
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def get_user_async(db: AsyncSession, username: str):
+    return (await db.execute(select(DBUser).where(DBUser.username == username))).scalars().first()
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return (await db.execute(select(DBUser).where(DBUser.email == email))).scalars().first()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user_async(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # End the read transaction so the connection returns to the pool while bcrypt runs
+    await db.commit()
+    if not await password_hasher.verify(password, user.hashed_password):
         return False
     return user
 
@@ -139,10 +210,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def token_claims(user: DBUser):
+    """JWT claims: the username as subject, plus the user id and role"""
+    return {"sub": user.username, "uid": user.id, "role": user.role}
+
+# Authenticated users by token subject, evicted when a user row is updated or deleted
+principal_cache = PrincipalCache()
+register_principal_invalidation(principal_cache, SessionLocal)
+register_principal_invalidation(principal_cache, AsyncORMSession)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -155,8 +238,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=username)
+    # Cached principal: no users query on the hot path
+    user = principal_cache.get(username)
     if user is None:
+        db_user = await get_user_async(db, username=username)
+        if db_user is None:
+            raise credentials_exception
+        user = principal_cache.put(db_user)
+    # A token issued to a deleted account must not authenticate a new user who took its username
+    token_user_id = payload.get("uid")
+    if token_user_id is not None and token_user_id != user.id:
         raise credentials_exception
     return user
 
@@ -170,9 +261,37 @@ def get_current_admin_user(current_user: DBUser = Depends(get_current_user)):
 
 # --- Admin User Management Endpoints ---
 
+USER_LIST_FIELDS = ("id", "username", "email", "role", "created_at", "updated_at")
+TEMPLATE_LIST_FIELDS = ("id", "name", "subject", "body", "category", "created_at", "updated_at")
+
+def list_page(request, db, model, allowed_fields, limit, after, fields, filters):
+    """Keyset page of a list endpoint; with ?fields= only those columns are selected and returned"""
+    try:
+        columns = parse_fields(fields, model, allowed_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Plain column rows straight from the table: nothing for response_model to re-validate
+    columns = columns or [getattr(model, name) for name in allowed_fields]
+    rows, next_cursor = keyset_page(db, model, limit, after=after, filters=filters, columns=columns)
+    return FastJSONResponse([dict(row) for row in rows], headers=page_headers(request, next_cursor))
+
 @app.get("/admin/users", response_model=List[UserSchema])
-def get_all_users(db: Session = Depends(get_db), admin: DBUser = Depends(get_current_admin_user)):
-    return db.query(DBUser).all()
+def get_all_users(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_PAGE_SIZE_MAX),
+    after: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma separated columns, e.g. id,username,role"),
+    q: Optional[str] = Query(None, description="Substring of the username or email"),
+    role: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    admin: DBUser = Depends(get_current_admin_user),
+):
+    filters = []
+    if q:
+        filters.append(or_(DBUser.username.icontains(q, autoescape=True), DBUser.email.icontains(q, autoescape=True)))
+    if role:
+        filters.append(DBUser.role == role)
+    return list_page(request, db, DBUser, USER_LIST_FIELDS, limit, after, fields, filters)
 
 @app.post("/admin/users", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 def create_user(user_create: AdminUserCreate, db: Session = Depends(get_db), admin: DBUser = Depends(get_current_admin_user)):
@@ -190,8 +309,9 @@ def create_user(user_create: AdminUserCreate, db: Session = Depends(get_db), adm
     if get_user_by_email(db, user_create.email.lower()):
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    # Outside the try so a full bcrypt pool reaches the 503 handler instead of becoming a 500
+    hashed_password = get_password_hash(user_create.password)
     try:
-        hashed_password = get_password_hash(user_create.password)
         new_user = DBUser(
             username=user_create.username.strip(),
             email=user_create.email.lower(),
@@ -238,63 +358,40 @@ def delete_user(user_id: int, db: Session = Depends(get_db), admin: DBUser = Dep
 
 # --- Dashboard and Analytics Endpoints ---
 
+def analytics_windows():
+    """Start of each reporting window, as naive UTC to match EmailLog.sent_at"""
+    now = datetime.utcnow()
+    return {
+        "today": now.replace(hour=0, minute=0, second=0, microsecond=0),
+        "last_7_days": now - timedelta(days=7),
+        "last_30_days": now - timedelta(days=30),
+        "this_month": now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+    }
+
 @app.get("/dashboard/stats", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    now = datetime.now(timezone.utc)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Email stats - include both campaign emails and individual emails
-    # Get all campaign IDs for this user
-    user_campaign_ids = [c.id for c in db.query(Campaign.id).filter(Campaign.user_id == current_user.id).all()]
-
-    today_count = db.query(EmailLog).filter(
-        EmailLog.sent_at >= today_start,
-        EmailLog.status == "sent",  # Only count sent emails
-        or_(
-            EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False,  # Campaign emails
-            EmailLog.user_id == current_user.id  # Individual emails
-        )
-    ).count()
-
-    week_count = db.query(EmailLog).filter(
-        EmailLog.sent_at >= week_ago,
-        EmailLog.status == "sent",  # Only count sent emails
-        or_(
-            EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False,  # Campaign emails
-            EmailLog.user_id == current_user.id  # Individual emails
-        )
-    ).count()
-
-    month_count = db.query(EmailLog).filter(
-        EmailLog.sent_at >= month_ago,
-        EmailLog.status == "sent",  # Only count sent emails
-        or_(
-            EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False,  # Campaign emails
-            EmailLog.user_id == current_user.id  # Individual emails
-        )
-    ).count()
-
-    this_month_count = db.query(EmailLog).filter(
-        EmailLog.sent_at >= month_start,
-        EmailLog.status == "sent",  # Only count sent emails
-        or_(
-            EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False,  # Campaign emails
-            EmailLog.user_id == current_user.id  # Individual emails
-        )
-    ).count()
+def get_dashboard_stats(request: Request, db: Session = Depends(get_read_db), current_user: DBUser = Depends(get_current_user)):
+    cached = analytics_cache.lookup("dashboard", current_user.id)
+    if cached is None:
+        # Read the version first so a write committed while computing invalidates this entry
+        version = analytics_cache.version(current_user.id)
+        cached = analytics_cache.store("dashboard", current_user.id, version, build_dashboard_stats(db, current_user))
+    return cached_response(request, cached)
+
+def build_dashboard_stats(db: Session, current_user: DBUser):
+    # Email stats (campaign and individual emails) and the campaign count in one query
+    counts, _, extras = window_status_counts(
+        db, current_user.id, analytics_windows(), statuses=("sent",),
+        extra_columns={"total_campaigns": campaign_count_column(current_user.id)}
+    )
 
     email_stats = EmailStats(
-        today=today_count,
-        last_7_days=week_count,
-        last_30_days=month_count,
-        this_month=this_month_count
+        today=counts["today"]["sent"],
+        last_7_days=counts["last_7_days"]["sent"],
+        last_30_days=counts["last_30_days"]["sent"],
+        this_month=counts["this_month"]["sent"]
     )
 
-    # Total campaigns
-    total_campaigns = db.query(Campaign).filter(Campaign.user_id == current_user.id).count()
+    total_campaigns = extras["total_campaigns"]
 
     # Recent campaigns
     recent_campaigns = db.query(Campaign).filter(Campaign.user_id == current_user.id).order_by(Campaign.created_at.desc()).limit(5).all()
@@ -308,35 +405,24 @@ def get_dashboard_stats(db: Session = Depends(get_db), current_user: DBUser = De
 # --- Comprehensive Analytics Endpoint ---
 
 @app.get("/analytics", response_model=ComprehensiveAnalytics)
-def get_comprehensive_analytics(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
-    now = datetime.now(timezone.utc)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    # Get all campaign IDs for this user
-    user_campaign_ids = [c.id for c in db.query(Campaign.id).filter(Campaign.user_id == current_user.id).all()]
-
-    # Helper function to get status counts for a time period
-    def get_status_counts(start_date):
-        base_query = db.query(EmailLog).filter(
-            EmailLog.sent_at >= start_date,
-            or_(
-                EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False,
-                EmailLog.user_id == current_user.id
-            )
-        )
-
-        sent = base_query.filter(EmailLog.status == "sent").count()
-        failed = base_query.filter(EmailLog.status == "failed").count()
-        bounced = base_query.filter(EmailLog.status == "bounced").count()
-        total = sent + failed + bounced
-
-        return EmailStatusStats(sent=sent, failed=failed, bounced=bounced, total=total)
+def get_comprehensive_analytics(request: Request, db: Session = Depends(get_read_db), current_user: DBUser = Depends(get_current_user)):
+    cached = analytics_cache.lookup("analytics", current_user.id)
+    if cached is None:
+        version = analytics_cache.version(current_user.id)
+        cached = analytics_cache.store("analytics", current_user.id, version, build_comprehensive_analytics(db, current_user))
+    return cached_response(request, cached)
+
+def build_comprehensive_analytics(db: Session, current_user: DBUser):
+    windows = {"all_time": datetime.min, **analytics_windows()}
+    counts, sources, _ = window_status_counts(db, current_user.id, windows)
+
+    def status_stats(window):
+        c = counts[window]
+        return EmailStatusStats(sent=c["sent"], failed=c["failed"], bounced=c["bounced"],
+                                total=c["sent"] + c["failed"] + c["bounced"])
 
     # Get overall statistics
-    all_time = get_status_counts(datetime.min)  # All emails
+    all_time = status_stats("all_time")  # All emails
 
     # Calculate delivery stats
     total_emails = all_time.total
@@ -355,38 +441,162 @@ def get_comprehensive_analytics(db: Session = Depends(get_db), current_user: DBU
 
     # Time-based statistics
     time_based = TimeBasedStats(
-        today=get_status_counts(today_start),
-        last_7_days=get_status_counts(week_ago),
-        last_30_days=get_status_counts(month_ago),
-        this_month=get_status_counts(month_start)
+        today=status_stats("today"),
+        last_7_days=status_stats("last_7_days"),
+        last_30_days=status_stats("last_30_days"),
+        this_month=status_stats("this_month")
     )
 
-    # Campaign vs Individual emails
-    campaign_emails = db.query(EmailLog).filter(
-        EmailLog.campaign_id.in_(user_campaign_ids) if user_campaign_ids else False
-    ).count()
-
-    individual_emails = db.query(EmailLog).filter(
-        EmailLog.user_id == current_user.id,
-        EmailLog.campaign_id.is_(None)
-    ).count()
-
     return ComprehensiveAnalytics(
         total_emails=total_emails,
         status_breakdown=all_time,
         delivery_stats=delivery_stats,
         time_based=time_based,
-        campaign_emails=campaign_emails,
-        individual_emails=individual_emails
+        campaign_emails=sources["campaign"],
+        individual_emails=sources["individual"]
+    )
+
+def get_owned_campaign(db: Session, campaign_id: int, current_user: DBUser):
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id, Campaign.user_id == current_user.id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+@app.get("/campaigns/{campaign_id}/stats", response_model=CampaignStats)
+def get_campaign_stats(campaign_id: int, db: Session = Depends(get_read_db), current_user: DBUser = Depends(get_current_user)):
+    # Counters are maintained on the campaign row, so this is a primary-key lookup
+    campaign = get_owned_campaign(db, campaign_id, current_user)
+    total = campaign.sent_count + campaign.failed_count + campaign.bounced_count
+    return CampaignStats(
+        campaign_id=campaign.id,
+        name=campaign.name,
+        status=campaign.status,
+        sent=campaign.sent_count,
+        failed=campaign.failed_count,
+        bounced=campaign.bounced_count,
+        total=total,
+        delivery_rate=round(campaign.sent_count / total * 100, 2) if total else 0.0,
+        last_event_at=campaign.last_event_at
     )
 
+# Default span of /analytics/timeseries when "from" is omitted
+TIMESERIES_DEFAULT_SPANS = {"hour": timedelta(hours=48), "day": timedelta(days=30), "week": timedelta(weeks=26)}
+
+def naive_utc(value):
+    """Query-string datetimes may carry an offset; EmailLog.sent_at is naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@app.get("/analytics/timeseries", response_model=TimeSeriesAnalytics)
+def get_analytics_timeseries(
+    bucket: str = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    campaign_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: DBUser = Depends(get_current_user)
+):
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail="bucket must be one of: hour, day, week")
+
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - TIMESERIES_DEFAULT_SPANS[bucket]
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / BUCKETS[bucket] >= MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range too large: at most {MAX_TIMESERIES_BUCKETS} {bucket} buckets")
+
+    if campaign_id is not None:
+        get_owned_campaign(db, campaign_id, current_user)
+
+    starts, series = timeseries_counts(db, current_user.id, bucket, start, end, campaign_id)
+    # Up to MAX_TIMESERIES_BUCKETS values per series: encode the model directly
+    return FastJSONResponse(TimeSeriesAnalytics(
+        bucket=bucket,
+        campaign_id=campaign_id,
+        buckets=starts,
+        sent=series["sent"],
+        failed=series["failed"],
+        bounced=series["bounced"],
+        total=[sum(counts) for counts in zip(series["sent"], series["failed"], series["bounced"])]
+    ))
+
+EXPORT_FORMATS = {"csv": ("text/csv", iter_csv), "ndjson": ("application/x-ndjson", iter_ndjson)}
+
+@app.get("/email-logs/export")
+def export_email_logs(
+    format: str = "csv",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    campaign_id: Optional[int] = None,
+    gzip: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: DBUser = Depends(get_current_user)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be one of: csv, ndjson")
+    if campaign_id is not None:
+        get_owned_campaign(db, campaign_id, current_user)
+
+    media_type, encode = EXPORT_FORMATS[format]
+    # The stream reads on its own connection: the request's session is closed before the body is sent
+    query = export_query(current_user.id, naive_utc(start), naive_utc(end), campaign_id)
+    body = encode(iter_rows(read_engine, query))
+    filename = f"email_logs.{format}"
+    if gzip:
+        body = gzip_stream(body)
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # --- Template Management Endpoints ---
 
 @app.get("/templates", response_model=List[TemplateSchema])
-def get_templates(db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+def get_templates(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated columns, e.g. id,name,category to skip body"),
+    q: Optional[str] = Query(None, description="Substring of the template name"),
+    category: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: DBUser = Depends(get_current_user),
+):
     # Return all templates for now (since existing DB doesn't have user_id column)
     # In future, we can filter by user when user_id column is added
-    return db.query(Template).all()
+    key = template_list_key(request)
+    cached = template_cache.lookup(key, TEMPLATES)
+    if cached is None:
+        try:
+            columns = parse_fields(fields, Template, TEMPLATE_LIST_FIELDS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filters = []
+        if q:
+            filters.append(Template.name.icontains(q, autoescape=True))
+        if category:
+            filters.append(Template.category == category)
+        version = template_cache.version(TEMPLATES)
+        # Plain column rows, so full and ?fields= pages are rendered the same way
+        columns = columns or [getattr(Template, name) for name in TEMPLATE_LIST_FIELDS]
+        rows, next_cursor = keyset_page(db, Template, limit, after=after, filters=filters, columns=columns)
+        cached = template_cache.store(key, TEMPLATES, version, [dict(row) for row in rows],
+                                      headers=page_headers(request, next_cursor))
+    return cached_response(request, cached)
+
+@app.get("/templates/{template_id}", response_model=TemplateSchema)
+def get_template(template_id: str, request: Request, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+    key = template_item_key(template_id)
+    cached = template_cache.lookup(key, TEMPLATES)
+    if cached is None:
+        version = template_cache.version(TEMPLATES)
+        columns = [getattr(Template, name) for name in TEMPLATE_LIST_FIELDS]
+        template = db.execute(select(*columns).where(Template.id == template_id)).mappings().first()
+        if not template:
+            raise HTTPException(status_code=404, detail="Template not found")
+        cached = template_cache.store(key, TEMPLATES, version, dict(template))
+    return cached_response(request, cached)
 
 @app.post("/templates", response_model=TemplateSchema)
 def create_template(template: TemplateCreate, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
@@ -451,21 +661,44 @@ def delete_template(template_id: str, db: Session = Depends(get_db), current_use
 
 # ULTRA-FAST Email Validation with Caching and Parallel Processing
 import asyncio
-import aiohttp
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
+from collections import Counter
+from dns_snapshot import DNS_SNAPSHOT_PATH, DNS_SNAPSHOT_INTERVAL, DNS_SNAPSHOT_MAX_DOMAINS, save_snapshot, load_snapshot
+from greylist import RecheckScheduler
+from dns_resolvers import HedgedResolver, DNS_RESOLVERS
+from typo_index import DomainTypoIndex
+from validation_results import ValidationRecord, validation_response
 
 # Global DNS cache with TTL
 dns_cache = {}
 dns_cache_lock = threading.Lock()
 DNS_CACHE_TTL = 3600  # 1 hour
 
+# Catch-all flag per domain learned from SMTP probes, and lookup counts used to
+# pick which domains go into the warm-start snapshot
+catch_all_cache = {}
+domain_hits = Counter()
+# Only the hottest domains matter for the snapshot: past twice this many entries the
+# counts are cut back to the top DOMAIN_HITS_KEEP and halved, so newer domains can catch up
+DOMAIN_HITS_KEEP = 2 * DNS_SNAPSHOT_MAX_DOMAINS
+
+def prune_domain_hits():
+    """Call with dns_cache_lock held"""
+    top = domain_hits.most_common(DOMAIN_HITS_KEEP)
+    domain_hits.clear()
+    domain_hits.update({domain: (hits + 1) // 2 for domain, hits in top})
+
 # Thread pool for DNS lookups
 dns_executor = ThreadPoolExecutor(max_workers=20)
 
-# Known valid domains - pre-validated to skip DNS lookups
-KNOWN_VALID_DOMAINS = {
-    # Major providers
+# MX lookups go to the resolvers in DNS_RESOLVERS (system resolver by default),
+# hedging slow queries onto a second resolver
+dns_resolver = HedgedResolver(DNS_RESOLVERS, executor=dns_executor)
+
+# Mailbox providers - pre-validated to skip DNS lookups, and the targets for typo suggestions
+MAILBOX_PROVIDER_DOMAINS = {
     'gmail.com', 'googlemail.com',  # Google
     'outlook.com', 'hotmail.com', 'live.com', 'msn.com',  # Microsoft
     'yahoo.com', 'yahoo.co.uk', 'yahoo.ca', 'yahoo.au', 'ymail.com', 'rocketmail.com',  # Yahoo
@@ -478,7 +711,30 @@ KNOWN_VALID_DOMAINS = {
     'gmx.com', 'gmx.net', 'gmx.de',  # GMX
     'web.de', 't-online.de',  # Deutsche Telekom
     'comcast.net', 'verizon.net', 'att.net', 'bellsouth.net',  # US ISPs
+}
+
+# Real mailbox domains that sit within a typo's distance of a provider above
+# (mail.com / gmail.com, yahoo.cn / yahoo.ca) - never reported as misspellings
+REAL_LOOKALIKE_DOMAINS = {
+    'mail.com', 'email.com', 'usa.com', 'post.com', 'gmx.at', 'gmx.ch', 'gmx.us',
+    'protonmail.ch', 'pm.me', 'cloud.com', 'mac.org',
+    'yahoo.cn', 'yahoo.co.in', 'yahoo.co.jp', 'yahoo.com.au', 'yahoo.com.br', 'yahoo.de', 'yahoo.es',
+    'yahoo.fr', 'yahoo.it', 'yahoo.in', 'yahoo.ie', 'yahoo.gr',
+    'hotmail.co.uk', 'hotmail.fr', 'hotmail.de', 'hotmail.it', 'hotmail.es', 'outlook.fr', 'outlook.de',
+    'live.co.uk', 'live.fr', 'live.ca', 'live.nl', 'msn.cn',
+    'aol.co.uk', 'aol.de', 'aol.fr', 'yandex.ua', 'yandex.by', 'yandex.kz',
+    'zoho.in', 'zoho.eu', 'web.com', 'gmail.co', 'me.org',
+    'fastmail.com', 'fastmail.fm', 'hushmail.com', 'tutanota.com', 'tuta.io', 'mailbox.org', 'posteo.de',
+    'qq.com', '163.com', '126.com', 'naver.com', 'daum.net', 'hanmail.net', 'rediffmail.com',
+    'orange.fr', 'free.fr', 'laposte.net', 'sfr.fr', 'libero.it', 'virgilio.it', 'seznam.cz', 'wp.pl',
+    'o2.pl', 'onet.pl', 'interia.pl', 'freenet.de', 'arcor.de',
+    'sky.com', 'btinternet.com', 'virginmedia.com', 'ntlworld.com', 'talktalk.net',
+    'shaw.ca', 'rogers.com', 'sympatico.ca', 'telus.net', 'bigpond.com', 'optusnet.com.au',
+    'cox.net', 'charter.net', 'earthlink.net', 'sbcglobal.net', 'frontier.com', 'juno.com', 'netzero.net',
+}
 
+# Known valid domains - pre-validated to skip DNS lookups
+KNOWN_VALID_DOMAINS = MAILBOX_PROVIDER_DOMAINS | {
     # Common business domains (pre-validated)
     'company.com', 'business.com', 'enterprise.com', 'corp.com', 'inc.com',
     'example.com', 'test.com', 'sample.com', 'demo.com', 'fake.com',
@@ -518,24 +774,34 @@ SPAM_TRAP_DOMAINS = {
 # Major providers that don't need SMTP verification
 MAJOR_PROVIDERS = KNOWN_VALID_DOMAINS.copy()
 
+# Typo suggestions only annotate results: a domain close to a mailbox provider
+# is still looked up, and only rejected as a typo when it has no MX record.
+# Domains later proven good by SMTP feed suggestions for other MX failures.
+provider_typo_index = DomainTypoIndex(MAILBOX_PROVIDER_DOMAINS, known=REAL_LOOKALIKE_DOMAINS | KNOWN_VALID_DOMAINS)
+observed_typo_index = DomainTypoIndex()
+
 async def cached_dns_lookup(domain):
     """Cached DNS MX lookup with TTL"""
     now = asyncio.get_event_loop().time()
 
     with dns_cache_lock:
+        domain_hits[domain] += 1
+        if len(domain_hits) > 2 * DOMAIN_HITS_KEEP:
+            prune_domain_hits()
         if domain in dns_cache:
             cached_result, timestamp = dns_cache[domain]
             if now - timestamp < DNS_CACHE_TTL:
+                DNS_CACHE_LOOKUPS.inc(result="hit")
                 return cached_result
             else:
                 del dns_cache[domain]
+                DNS_CACHE_LOOKUPS.inc(result="expired")
+        else:
+            DNS_CACHE_LOOKUPS.inc(result="miss")
 
     try:
-        # Use thread pool for DNS lookup
-        mx_records = await asyncio.get_event_loop().run_in_executor(
-            dns_executor, dns.resolver.resolve, domain, 'MX'
-        )
-        result = str(mx_records[0].exchange)
+        # Hedged lookup across the configured resolvers (thread pool under the hood)
+        result = await dns_resolver.resolve_mx(domain)
 
         with dns_cache_lock:
             dns_cache[domain] = (result, now)
@@ -547,13 +813,99 @@ async def cached_dns_lookup(domain):
             dns_cache[domain] = (None, now)
         return None
 
+def get_cached_catch_all(domain):
+    """Return the cached catch-all flag for a domain, or None if unknown/expired"""
+    with dns_cache_lock:
+        if domain in catch_all_cache:
+            is_catch_all, timestamp = catch_all_cache[domain]
+            # The event loop clock is time.monotonic(), so this is safe from worker threads too
+            if time.monotonic() - timestamp < DNS_CACHE_TTL:
+                return is_catch_all
+            del catch_all_cache[domain]
+    return None
+
+def save_dns_snapshot():
+    """Dump the hottest domains of the DNS/catch-all caches to disk"""
+    if not DNS_SNAPSHOT_PATH:
+        return
+    with dns_cache_lock:
+        dns_entries = dict(dns_cache)
+        catch_all_entries = dict(catch_all_cache)
+        hits = dict(domain_hits)
+    try:
+        save_snapshot(DNS_SNAPSHOT_PATH, dns_entries, catch_all_entries, hits)
+    except OSError as e:
+        print(f"Failed to save DNS snapshot: {e}")
+
+def load_dns_snapshot():
+    """Warm the DNS/catch-all caches from the last snapshot"""
+    try:
+        dns_entries, catch_all_entries, hits = load_snapshot(DNS_SNAPSHOT_PATH, DNS_CACHE_TTL)
+    except Exception as e:  # A bad snapshot must never stop the worker from starting
+        print(f"Failed to load DNS snapshot: {e}")
+        return
+    with dns_cache_lock:
+        for domain, entry in dns_entries.items():
+            dns_cache.setdefault(domain, entry)
+        for domain, entry in catch_all_entries.items():
+            catch_all_cache.setdefault(domain, entry)
+        domain_hits.update(hits)
+        if len(domain_hits) > 2 * DOMAIN_HITS_KEEP:
+            prune_domain_hits()
+
+async def periodic_dns_snapshot():
+    while True:
+        await asyncio.sleep(DNS_SNAPSHOT_INTERVAL)
+        await asyncio.to_thread(save_dns_snapshot)
+
+@app.on_event("startup")
+async def warm_dns_cache():
+    load_dns_snapshot()
+    if DNS_SNAPSHOT_PATH and DNS_SNAPSHOT_INTERVAL > 0:
+        app.state.dns_snapshot_task = asyncio.create_task(periodic_dns_snapshot())
+    app.state.greylist_task = asyncio.create_task(greylist_scheduler.run())
+
+@app.on_event("shutdown")
+async def persist_dns_cache():
+    for task_name in ("dns_snapshot_task", "greylist_task"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    save_dns_snapshot()
+
+def smtp_status_to_result(email, smtp_status):
+    """Map an SMTP probe status onto a validation record"""
+    if smtp_status == "verified":
+        return ValidationRecord(email=email, valid=True, deliverable=True, reason="Mailbox Verified")
+    elif smtp_status == "catch_all":
+        return ValidationRecord(email=email, valid=True, deliverable=True, reason="Domain Valid (Catch-all)")
+    elif smtp_status == "not_verified":
+        return ValidationRecord(email=email, valid=False, deliverable=False, reason="Mailbox Not Found")
+    elif smtp_status == "greylisted":
+        return ValidationRecord(email=email, valid=True, deliverable=False, reason="Greylisted – recheck scheduled")
+    elif smtp_status == "smtp_unreachable":
+        return ValidationRecord(email=email, valid=True, deliverable=False, reason="SMTP unreachable – possibly valid")
+    else:  # server_error
+        # If SMTP fails, still mark as valid since many servers block verification
+        return ValidationRecord(email=email, valid=True, deliverable=True, reason="Domain Valid (SMTP Blocked)")
+
 async def validate_single_email(email):
     """Advanced email validation with comprehensive checks"""
     email = email.strip()
+    record = await check_email(email)
+    # A near-miss of a mailbox provider is only a hint on top of the domain's own checks
+    if record.suggestion is None and EMAIL_VALIDATION_PATTERN.match(email):
+        suggested_domain = provider_typo_index.suggest(email.split('@')[1])
+        if suggested_domain:
+            record.suggestion = f"{email.split('@')[0]}@{suggested_domain}"
+    return record
+
+async def check_email(email):
+    """Validation checks for one stripped address, without typo suggestions for reachable domains"""
 
     # 1. Format Check (instant)
     if not EMAIL_VALIDATION_PATTERN.match(email):
-        return EmailValidationResult(email=email, valid=False, deliverable=False, reason="Invalid Format")
+        return ValidationRecord(email=email, valid=False, deliverable=False, reason="Invalid Format")
 
     local_part, domain = email.split('@')
     domain = domain.lower()
@@ -561,47 +913,63 @@ async def validate_single_email(email):
 
     # 2. Check disposable domains first
     if domain in DISPOSABLE_DOMAINS:
-        return EmailValidationResult(email=email, valid=False, deliverable=False, reason="Disposable Email Domain")
+        return ValidationRecord(email=email, valid=False, deliverable=False, reason="Disposable Email Domain")
 
     # 3. Check spam trap domains
     if domain in SPAM_TRAP_DOMAINS:
-        return EmailValidationResult(email=email, valid=False, deliverable=False, reason="Spam Trap Domain")
+        return ValidationRecord(email=email, valid=False, deliverable=False, reason="Spam Trap Domain")
 
     # 4. Check known valid domains (instant - no network calls)
     if domain in KNOWN_VALID_DOMAINS:
         if domain in MAJOR_PROVIDERS:
-            return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Valid Domain (Major Provider)")
+            return ValidationRecord(email=email, valid=True, deliverable=True, reason="Valid Domain (Major Provider)")
         else:
-            return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Valid Domain")
+            return ValidationRecord(email=email, valid=True, deliverable=True, reason="Valid Domain")
 
-    # 5. For unknown domains, check DNS first
+    # 5. For unknown domains, check DNS
     mail_server = await cached_dns_lookup(domain)
     if not mail_server:
-        return EmailValidationResult(email=email, valid=False, deliverable=False, reason="Invalid Domain (No MX Record)")
-
-    # 6. Domain has MX, so role-based emails are acceptable
+        # 6. No MX: a near-miss of a mailbox provider (gmial.com) is most likely a typo
+        suggested_domain = provider_typo_index.suggest(domain)
+        if suggested_domain:
+            return ValidationRecord(email=email, valid=False, deliverable=False, reason="Possible Domain Typo",
+                                         suggestion=f"{email.split('@')[0]}@{suggested_domain}")
+        suggested_domain = observed_typo_index.suggest(domain)
+        return ValidationRecord(email=email, valid=False, deliverable=False, reason="Invalid Domain (No MX Record)",
+                                     suggestion=f"{email.split('@')[0]}@{suggested_domain}" if suggested_domain else None)
+
+    # 7. Domain has MX, so role-based emails are acceptable
     if local_part in ROLE_PREFIXES:
-        return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Role-based / non-personal")
+        return ValidationRecord(email=email, valid=True, deliverable=True, reason="Role-based / non-personal")
+
+    # 8. Use the outcome of a finished greylist re-check, or report one still queued
+    deferred = greylist_scheduler.get_result(email)
+    if deferred:
+        return smtp_status_to_result(email, deferred["status"])
+    if greylist_scheduler.is_pending(email):
+        return smtp_status_to_result(email, "greylisted")
 
-    # 7. Advanced SMTP verification with catch-all detection
+    # 9. Known catch-all domains accept every address, so skip the SMTP probe
+    if get_cached_catch_all(domain):
+        return ValidationRecord(email=email, valid=True, deliverable=True, reason="Domain Valid (Catch-all)")
+
+    # 10. Advanced SMTP verification with catch-all detection
     try:
-        smtp_result = await asyncio.to_thread(check_smtp_advanced, mail_server, email, domain)
-
-        if smtp_result["status"] == "verified":
-            return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Mailbox Verified")
-        elif smtp_result["status"] == "catch_all":
-            return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Domain Valid (Catch-all)")
-        elif smtp_result["status"] == "not_verified":
-            return EmailValidationResult(email=email, valid=False, deliverable=False, reason="Mailbox Not Found")
-        elif smtp_result["status"] == "smtp_unreachable":
-            return EmailValidationResult(email=email, valid=True, deliverable=False, reason="SMTP unreachable – possibly valid")
-        else:  # server_error
-            # If SMTP fails, still mark as valid since many servers block verification
-            return EmailValidationResult(email=email, valid=True, deliverable=True, reason="Domain Valid (SMTP Blocked)")
+        smtp_result = await asyncio.to_thread(probe_smtp, mail_server, email, domain)
+        if smtp_result["status"] in ("verified", "catch_all"):
+            observed_typo_index.add(domain)
+            with dns_cache_lock:
+                catch_all_cache[domain] = (smtp_result["status"] == "catch_all", asyncio.get_event_loop().time())
+
+        if smtp_result["status"] == "greylisted":
+            # Temporary 4xx answer - re-check after the greylist window instead of failing
+            greylist_scheduler.schedule(email, domain, mail_server)
+
+        return smtp_status_to_result(email, smtp_result["status"])
 
     except Exception:
         # If advanced SMTP fails, mark as SMTP unreachable
-        return EmailValidationResult(email=email, valid=True, deliverable=False, reason="SMTP unreachable – possibly valid")
+        return ValidationRecord(email=email, valid=True, deliverable=False, reason="SMTP unreachable – possibly valid")
 
 @app.post("/email/validate", response_model=EmailValidationResponse)
 async def validate_emails(request: EmailValidationRequest, current_user: DBUser = Depends(get_current_user)):
@@ -629,7 +997,7 @@ async def validate_emails(request: EmailValidationRequest, current_user: DBUser
     for i, result in enumerate(results):
         if isinstance(result, Exception):
             # If validation failed, return a safe result
-            final_results.append(EmailValidationResult(
+            final_results.append(ValidationRecord(
                 email=request.emails[i],
                 valid=False,
                 deliverable=False,
@@ -638,11 +1006,45 @@ async def validate_emails(request: EmailValidationRequest, current_user: DBUser
         else:
             final_results.append(result)
 
-    return EmailValidationResponse(results=final_results)
+    # Encode the compact records directly instead of re-validating them through response_model
+    return validation_response(final_results)
+
+@app.get("/dns/resolvers")
+def get_dns_resolver_stats(admin: DBUser = Depends(get_current_admin_user)):
+    """Per-resolver health and latency of the MX lookup path"""
+    with dns_cache_lock:
+        cache_size = len(dns_cache)
+    return {**dns_resolver.stats(), "cache_size": cache_size}
+
+@app.get("/auth/password-pool")
+def get_password_pool_stats(admin: DBUser = Depends(get_current_admin_user)):
+    """Load and latency of the bcrypt worker pool"""
+    return password_hasher.stats()
+
+@app.post("/email/validate/deferred", response_model=EmailValidationResponse)
+async def get_deferred_validations(request: EmailValidationRequest, current_user: DBUser = Depends(get_current_user)):
+    """Current verdict for addresses whose validation was deferred by greylisting"""
+    if not request.emails or len(request.emails) == 0:
+        raise HTTPException(status_code=400, detail="No emails provided")
+    if len(request.emails) > 1000:
+        raise HTTPException(status_code=400, detail="Maximum 1000 emails allowed")
+
+    results = []
+    for email in request.emails:
+        email = email.strip()
+        deferred = greylist_scheduler.get_result(email)
+        if deferred:
+            results.append(smtp_status_to_result(email, deferred["status"]))
+        elif greylist_scheduler.is_pending(email):
+            results.append(smtp_status_to_result(email, "greylisted"))
+        else:
+            results.append(ValidationRecord(email=email, valid=False, deliverable=False, reason="No Deferred Check"))
+    return validation_response(results)
 
 # Ultra-fast SMTP checking with optimized timeout
 def check_smtp_mailbox_fast(mail_server, email_address, domain):
     """Fast SMTP verification with shorter timeout"""
+    import smtplib
     try:
         with smtplib.SMTP(mail_server, timeout=5) as server:  # Reduced timeout
             server.set_debuglevel(0)
@@ -672,6 +1074,7 @@ def check_smtp_advanced(mail_server, email_address, domain):
     random_user = uuid.uuid4().hex[:16]
     fake_email_for_check = f"{random_user}@{domain}"
 
+    import smtplib
     try:
         with smtplib.SMTP(mail_server, timeout=8) as server:  # Slightly longer timeout for advanced check
             server.set_debuglevel(0)
@@ -681,6 +1084,10 @@ def check_smtp_advanced(mail_server, email_address, domain):
             # Check the actual email address
             code_real, _ = server.rcpt(email_address)
 
+            if 400 <= code_real < 500:
+                # Temporary failure (typically greylisting) - not a verdict on the mailbox
+                return {"status": "greylisted", "message": f"Temporary failure with code {code_real}"}
+
             if code_real != 250:
                 # If the real email is rejected, we know it's not valid
                 return {"status": "not_verified", "message": f"Mailbox rejected with code {code_real}"}
@@ -695,12 +1102,78 @@ def check_smtp_advanced(mail_server, email_address, domain):
                 # If the server accepts the real one but rejects the fake one, it's truly verified
                 return {"status": "verified", "message": "Mailbox exists"}
 
+    except smtplib.SMTPResponseException as e:
+        if 400 <= e.smtp_code < 500:
+            return {"status": "greylisted", "message": f"Temporary failure with code {e.smtp_code}"}
+        return {"status": "smtp_unreachable", "message": f"SMTP unreachable: {str(e)}"}
     except smtplib.SMTPException as e:
         return {"status": "smtp_unreachable", "message": f"SMTP unreachable: {str(e)}"}
     except (ConnectionError, OSError) as e:
         return {"status": "smtp_unreachable", "message": f"SMTP unreachable: {str(e)}"}
     except Exception as e:
         return {"status": "smtp_unreachable", "message": f"SMTP unreachable: {str(e)}"}
+
+# Batched SMTP re-check used by the greylist scheduler
+def check_smtp_batch(mail_server, domain, email_addresses):
+    """Re-probe several addresses of one domain over a single SMTP connection"""
+    import smtplib
+    results = {}
+    try:
+        with smtplib.SMTP(mail_server, timeout=8) as server:
+            server.set_debuglevel(0)
+            server.helo('kalkiavatar.org')
+            server.mail('verify@kalkiavatar.org')
+
+            codes = {email_address: server.rcpt(email_address)[0] for email_address in email_addresses}
+
+            # The first probe of a greylisting server stopped before its catch-all check, so
+            # the flag is usually unknown here: ask once per batch with a random address
+            is_catch_all = get_cached_catch_all(domain)
+            if is_catch_all is None and 250 in codes.values():
+                code_fake, _ = server.rcpt(f"{uuid.uuid4().hex[:16]}@{domain}")
+                if code_fake == 250 or code_fake >= 500:
+                    is_catch_all = code_fake == 250
+                    with dns_cache_lock:
+                        catch_all_cache[domain] = (is_catch_all, time.monotonic())
+
+            for email_address, code in codes.items():
+                if code == 250 and is_catch_all is None:
+                    # The random address was greylisted too - re-check rather than guess "verified"
+                    results[email_address] = {"status": "greylisted", "message": "Catch-all check deferred"}
+                elif code == 250:
+                    status_name = "catch_all" if is_catch_all else "verified"
+                    results[email_address] = {"status": status_name, "message": "Mailbox exists"}
+                elif 400 <= code < 500:
+                    results[email_address] = {"status": "greylisted", "message": f"Temporary failure with code {code}"}
+                else:
+                    results[email_address] = {"status": "not_verified", "message": f"Mailbox rejected with code {code}"}
+
+    except smtplib.SMTPResponseException as e:
+        status_name = "greylisted" if 400 <= e.smtp_code < 500 else "smtp_unreachable"
+        for email_address in email_addresses:
+            results.setdefault(email_address, {"status": status_name, "message": f"SMTP error: {str(e)}"})
+    except Exception as e:
+        for email_address in email_addresses:
+            results.setdefault(email_address, {"status": "smtp_unreachable", "message": f"SMTP unreachable: {str(e)}"})
+    return results
+
+# Probe wrappers recording latency and outcome per MX host for /metrics
+def probe_smtp(mail_server, email_address, domain):
+    started = time.perf_counter()
+    result = check_smtp_advanced(mail_server, email_address, domain)
+    SMTP_PROBE_LATENCY.observe(time.perf_counter() - started, mx=mail_server, probe="advanced")
+    SMTP_PROBE_OUTCOMES.inc(mx=mail_server, probe="advanced", status=result["status"])
+    return result
+
+def probe_smtp_batch(mail_server, domain, email_addresses):
+    started = time.perf_counter()
+    results = check_smtp_batch(mail_server, domain, email_addresses)
+    SMTP_PROBE_LATENCY.observe(time.perf_counter() - started, mx=mail_server, probe="batch")
+    for result in results.values():
+        SMTP_PROBE_OUTCOMES.inc(mx=mail_server, probe="batch", status=result["status"])
+    return results
+
+greylist_scheduler = RecheckScheduler(probe_smtp_batch)
 # --- AI Email Generation Endpoint ---
 
 @app.post("/ai/generate-email", response_model=EmailGenerationResponse)
@@ -723,6 +1196,7 @@ Format your response as JSON with 'subject' and 'body' fields.
 """
 
     try:
+        import requests
         response = requests.post(
             "https://api.perplexity.ai/chat/completions",
             headers={
@@ -766,8 +1240,8 @@ Format your response as JSON with 'subject' and 'body' fields.
 
 # Endpoints
 @app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -776,7 +1250,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -785,27 +1259,28 @@ async def google_login(request: Request):
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="Google Oauth not configured.")
     redirect_uri = "http://localhost:8000/auth/google/callback"
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri)
 
 @app.get("/auth/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
+async def google_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="Google OAuth not configured.")
     
     try:
+        oauth = get_oauth()
         token = await oauth.google.authorize_access_token(request)
         user_info_response = await oauth.google.get('https://www.googleapis.com/oauth2/v3/userinfo', token=token)
         user_info = user_info_response.json()
         
         if user_info and 'email' in user_info:
             email = user_info['email']
-            db_user = get_user_by_email(db, email)
+            db_user = await get_user_by_email_async(db, email)
 
             if not db_user:
                 return RedirectResponse(url="http://localhost:8000/?contact_admin=1", status_code=302)
             else:
                 access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-                access_token = create_access_token(data={"sub": db_user.username}, expires_delta=access_token_expires)
+                access_token = create_access_token(data=token_claims(db_user), expires_delta=access_token_expires)
                 return RedirectResponse(url=f"http://localhost:8000/?token={access_token}", status_code=302)
         else:
             raise HTTPException(status_code=400, detail="Google login failed: Could not retrieve email.")
@@ -822,66 +1297,99 @@ async def read_users_me(current_user: DBUser = Depends(get_current_user)):
 @app.put("/users/me/update", response_model=UserSchema)
 async def update_user_me(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: DBUser = Depends(get_current_user)
 ):
+    # current_user is a cached snapshot; modify the row loaded in this session
+    user = await db.get(DBUser, current_user.id)
+
     # Check for username conflicts
-    if user_update.username and user_update.username != current_user.username:
-        existing_user = get_user(db, user_update.username)
+    if user_update.username and user_update.username != user.username:
+        existing_user = await get_user_async(db, user_update.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already registered")
-        current_user.username = user_update.username
+        user.username = user_update.username
 
     # Check for email conflicts
-    if user_update.email and user_update.email != current_user.email:
-        existing_user = get_user_by_email(db, user_update.email)
+    if user_update.email and user_update.email != user.email:
+        existing_user = await get_user_by_email_async(db, user_update.email)
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
-        current_user.email = user_update.email
+        user.email = user_update.email
     
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await db.commit()
+    await db.refresh(user)
+    return user
 
 @app.put("/users/me/change-password")
 async def change_password(
     password_update: UserPasswordUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: DBUser = Depends(get_current_user)
 ):
+    user = await db.get(DBUser, current_user.id)
+
     # Verify the current password
-    if not verify_password(password_update.current_password, current_user.hashed_password):
+    if not await password_hasher.verify(password_update.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
 
     # Hash the new password and update the user
-    current_user.hashed_password = get_password_hash(password_update.new_password)
-    db.commit()
+    user.hashed_password = await password_hasher.hash(password_update.new_password)
+    await db.commit()
 
     return {"message": "Password updated successfully"}
 
+_sendgrid_client = None
+
+def get_sendgrid_client():
+    """SendGrid client, imported and created on the first send"""
+    global _sendgrid_client
+    if _sendgrid_client is None:
+        import sendgrid
+        _sendgrid_client = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+    return _sendgrid_client
+
 @app.post("/api/send-email")
-async def send_email(email_request: EmailRequest, db: Session = Depends(get_db), current_user: DBUser = Depends(get_current_user)):
+async def send_email(email_request: EmailRequest, db: AsyncSession = Depends(get_async_db), current_user: DBUser = Depends(get_current_user)):
     if not SENDGRID_API_KEY:
         raise HTTPException(status_code=500, detail="SendGrid not configured")
+    if email_request.campaign_id is not None:
+        owned = await db.scalar(select(Campaign.id).where(Campaign.id == email_request.campaign_id, Campaign.user_id == current_user.id))
+        if not owned:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+    if await db.get(EmailSuppression, email_request.to_email.lower()):
+        raise HTTPException(status_code=400, detail="Recipient is on the suppression list (bounced, unsubscribed or reported spam)")
     try:
-        sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+        sg = get_sendgrid_client()
+        from sendgrid.helpers.mail import Mail
         message = Mail(
             from_email=email_request.from_email or SENDGRID_FROM_EMAIL,
             to_emails=email_request.to_email,
             subject=email_request.subject,
             plain_text_content=email_request.body
         )
-        response = sg.send(message)
+        # The SendGrid client is blocking; keep the event loop free while it waits
+        started = time.perf_counter()
+        try:
+            response = await asyncio.to_thread(sg.send, message)
+        except Exception as e:
+            # python_http_client errors carry the HTTP status; anything else never got a response
+            SENDGRID_RESPONSES.inc(status=getattr(e, "status_code", None) or "error")
+            raise
+        finally:
+            SENDGRID_LATENCY.observe(time.perf_counter() - started)
+        SENDGRID_RESPONSES.inc(status=response.status_code)
 
         # Log the email
         email_log = EmailLog(
             user_id=current_user.id,  # Associate with current user
-            campaign_id=None,  # For now, no campaign
+            campaign_id=email_request.campaign_id,  # Campaign counters are updated in the same flush
             recipient_email=email_request.to_email,
-            status="sent"
+            status="sent",
+            message_id=response.headers.get("X-Message-Id")  # Matched by the event webhook
         )
         db.add(email_log)
-        db.commit()
+        await db.commit()
 
         return {"status": "success", "message": "Email sent"}
     except Exception as e:
@@ -889,13 +1397,13 @@ async def send_email(email_request: EmailRequest, db: Session = Depends(get_db),
         try:
             email_log = EmailLog(
                 user_id=current_user.id,  # Associate with current user
-                campaign_id=None,
+                campaign_id=email_request.campaign_id,
                 recipient_email=email_request.to_email,
                 status="failed",
                 error_message=str(e)[:500]  # Limit error message length
             )
             db.add(email_log)
-            db.commit()
+            await db.commit()
         except Exception as db_error:
             # Don't let database errors mask the original SendGrid error
             print(f"Failed to log email error: {db_error}")
@@ -911,16 +1419,117 @@ async def send_email(email_request: EmailRequest, db: Session = Depends(get_db),
 
         raise HTTPException(status_code=500, detail=error_msg)
 
-# Serve frontend - mount static files with lower priority so API routes take precedence
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+# --- SendGrid Event Webhook ---
+
+webhook_ingestor = EventIngestor(engine, on_applied=analytics_cache.bump)
+
+@app.post("/webhooks/sendgrid/events")
+async def receive_sendgrid_events(request: Request):
+    if not SENDGRID_WEBHOOK_PUBLIC_KEY:
+        raise HTTPException(status_code=500, detail="SendGrid webhook verification key not configured")
+    body = await request.body()
+    if not verify_signature(body, request.headers.get(SIGNATURE_HEADER), request.headers.get(TIMESTAMP_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid webhook signature")
+    try:
+        events = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(events, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of events")
+
+    # Applied in batches by the background task; 503 makes SendGrid retry when the queue is full.
+    # Malformed events are acknowledged but dropped - redelivering them would not help.
+    accepted = [e for e in events if valid_event(e)]
+    if not webhook_ingestor.enqueue(accepted):
+        raise HTTPException(status_code=503, detail="Event queue full")
+    return {"status": "queued", "events": len(accepted), "rejected": len(events) - len(accepted)}
+
+@app.on_event("startup")
+async def start_webhook_ingestor():
+    app.state.webhook_task = asyncio.create_task(webhook_ingestor.run())
+
+@app.on_event("shutdown")
+async def drain_webhook_ingestor():
+    task = getattr(app.state, "webhook_task", None)
+    if task:
+        task.cancel()
+    # Apply whatever is still queued before the process exits
+    try:
+        await asyncio.to_thread(webhook_ingestor.flush_all)
+    except Exception as e:
+        print(f"Could not apply queued webhook events on shutdown: {e}")
+
+# --- Metrics ---
+# Request, SMTP, SendGrid and DNS cache counters are recorded where they happen (see metrics.py);
+# the gauges below read the state of caches, pools and queues when /metrics is scraped.
+
+def dns_cache_size():
+    with dns_cache_lock:
+        return len(dns_cache)
+
+def dns_cache_hit_ratio():
+    hits = DNS_CACHE_LOOKUPS.value(result="hit")
+    total = hits + DNS_CACHE_LOOKUPS.value(result="miss") + DNS_CACHE_LOOKUPS.value(result="expired")
+    return hits / total if total else None
+
+def db_pool_usage(stat):
+    """checkedout() / size() / overflow() per connection pool; pools without one (NullPool) are skipped"""
+    pools = {"primary": engine.pool, "async": async_engine.sync_engine.pool}
+    if read_engine is not engine:
+        pools["replica"] = read_engine.pool
+    return {(name,): getattr(pool, stat)() for name, pool in pools.items() if hasattr(pool, stat)}
+
+Gauge("dns_cache_entries", "Domains in the MX cache", callback=dns_cache_size)
+Gauge("dns_cache_hit_ratio", "Share of MX cache lookups answered from the cache", callback=dns_cache_hit_ratio)
+CounterFunction("dns_hedged_queries_total", "MX queries sent to a backup resolver",
+                callback=lambda: dns_resolver.hedged_queries)
+Gauge("greylist_pending", "Addresses waiting for a greylist re-probe", callback=lambda: greylist_scheduler.pending_count())
+Gauge("db_pool_checked_out", "Connections in use", ("engine",), callback=lambda: db_pool_usage("checkedout"))
+Gauge("db_pool_size", "Configured pool size", ("engine",), callback=lambda: db_pool_usage("size"))
+Gauge("db_pool_overflow", "Connections opened beyond the pool size", ("engine",), callback=lambda: {k: max(0, v) for k, v in db_pool_usage("overflow").items()})  # negative until the pool fills
+Gauge("password_pool_in_flight", "bcrypt operations running", callback=lambda: password_hasher.stats()["in_flight"])
+Gauge("password_pool_pending", "bcrypt operations waiting for a worker", callback=lambda: password_hasher.stats()["pending"])
+CounterFunction("password_pool_rejected_total", "bcrypt operations refused with 503",
+                callback=lambda: password_hasher.rejected)
+CounterFunction("auth_cache_lookups_total", "Principal cache lookups in get_current_user", ("result",),
+                callback=lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses})
+Gauge("webhook_events_queued", "SendGrid events waiting to be applied", callback=lambda: webhook_ingestor.queued())
+CounterFunction("webhook_events_applied_total", "SendGrid events applied", callback=lambda: webhook_ingestor.applied)
+CounterFunction("webhook_failed_batches_total", "SendGrid event batch attempts that failed",
+                callback=lambda: webhook_ingestor.failed_batches)
+CounterFunction("webhook_events_dead_lettered_total", "SendGrid events dropped after repeated failures",
+                callback=lambda: webhook_ingestor.dead_lettered)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Prometheus text format; enabled by METRICS_TOKEN, which scrapers send as a bearer token"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    app.state.loop_lag_task = asyncio.create_task(monitor_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    task = getattr(app.state, "loop_lag_task", None)
+    if task:
+        task.cancel()
+
+# Serve frontend - mount static files with lower priority so API routes take precedence.
+# After `python build_assets.py` the bundled, precompressed build in static/dist is served.
+from static_assets import PrecompressedStaticFiles, index_response, STATIC_DIR
 
 @app.get("/")
-async def read_root():
-    return FileResponse("index.html", media_type="text/html")
+async def read_root(request: Request):
+    return index_response(request)
 
 # Mount static files at a specific path to avoid conflicts with API routes
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="localhost", port=8000)
\ No newline at end of file
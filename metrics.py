@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+
+# Minimal Prometheus-style metrics: counters, histograms and gauges kept in
+# process and rendered in the text exposition format (version 0.0.4) by
+# GET /metrics. Each worker process exposes its own values; Prometheus sums
+# them across the scrape targets. Label values such as MX hosts are
+# unbounded, so each metric keeps at most METRICS_MAX_SERIES label sets and
+# folds the rest into label value "other".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # /metrics is disabled unless set; scrape with this bearer token
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "500"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))  # seconds between event-loop lag samples
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:  # A broken callback must not take the whole scrape down
+                print(f"Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if key not in self._series and len(self._series) >= METRICS_MAX_SERIES:
+            key = ("other",) * len(self.labelnames)
+        return key
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in series]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        with self._lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts, plus the overflow bucket, then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        samples = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                samples.append((self.name + "_bucket", _format_labels(self.labelnames, key, [("le", le)]), cumulative))
+            samples.append((self.name + "_sum", _format_labels(self.labelnames, key), total))
+            samples.append((self.name + "_count", _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time by callback() -> number or {label values tuple: number}"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), callback=None, registry=REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            series = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                series = list(self._series.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in series
+                if value is not None]
+
+
+class CounterFunction(Gauge):
+    """A monotonically increasing count kept elsewhere (e.g. cache hits), read at scrape time"""
+
+    type = "counter"
+
+
+# --- Metrics recorded across the app ---
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status",
+                        ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time from request to the end of the response body",
+                         ("method", "route"))
+DNS_CACHE_LOOKUPS = Counter("dns_cache_lookups_total", "MX cache lookups by result (hit, miss, expired)",
+                            ("result",))
+SMTP_PROBE_LATENCY = Histogram("smtp_probe_duration_seconds", "SMTP mailbox probe time per MX host",
+                               ("mx", "probe"))
+SMTP_PROBE_OUTCOMES = Counter("smtp_probe_outcomes_total", "SMTP probe results per MX host and status",
+                              ("mx", "probe", "status"))
+SENDGRID_LATENCY = Histogram("sendgrid_request_duration_seconds", "SendGrid Mail Send API call time")
+SENDGRID_RESPONSES = Counter("sendgrid_responses_total", "SendGrid Mail Send responses by HTTP status "
+                             "(\"error\" when no response was received)", ("status",))
+LOOP_LAG = Histogram("event_loop_lag_seconds", "How late the event loop ran a timer, sampled every "
+                     f"{LOOP_LAG_INTERVAL}s", buckets=LOOP_LAG_BUCKETS)
+LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+def route_label(scope):
+    """Route template (/campaigns/{campaign_id}/stats), never the raw path, to bound the label set"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("root_path") or "unmatched"  # Mounts (e.g. /static) set root_path; 404s have neither
+
+
+class MetricsMiddleware:
+    """Counts requests and times them until the last body chunk is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500  # unless a response starts
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_label(scope)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status_code)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=scope["method"], route=route)
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sleep for interval and record how much later than that the loop woke us up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
@@ -1,53 +1,295 @@
 #!/usr/bin/env python3
 import os
+import sys
+from datetime import datetime
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.ext.compiler import compiles
 
 load_dotenv()
 
-def migrate_database():
+# Versioned schema migrations. Applied versions are recorded in
+# schema_migrations, so running this script repeatedly only applies new ones.
+#
+#   python migrate_db.py                 create missing tables and apply pending migrations
+#                                        (run at deploy time when DB_INIT_ON_STARTUP=false)
+#   python migrate_db.py --status        list applied / pending migrations
+#   python migrate_db.py --check-plans   EXPLAIN the dashboard queries and fail
+#                                        if email_logs is scanned without an index
+
+
+def get_engine():
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise ValueError("DATABASE_URL environment variable is required")
-    
+
     if not database_url.startswith(('postgresql://', 'sqlite://')):
         raise ValueError("DATABASE_URL must be a valid PostgreSQL or SQLite connection string")
-    
-    engine = create_engine(database_url)
+
+    return create_engine(database_url)
+
+
+def create_index(conn, name, table, columns):
+    """CREATE INDEX without blocking writes on PostgreSQL (needs an autocommit connection)"""
+    from partitions import is_partitioned
+
+    # Partitioned parents cannot be indexed concurrently; the index cascades to each partition
+    online = conn.dialect.name == "postgresql" and not (table == "email_logs" and is_partitioned(conn))
+    concurrently = "CONCURRENTLY " if online else ""
+    conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({', '.join(columns)});"))
+
+
+def migration_1_log_columns(conn):
+    """Template timestamps, email_logs.user_id, nullable email_logs.campaign_id"""
+    if conn.dialect.name != "postgresql":
+        return  # SQLite databases are created by create_all with the current schema
+    print("Adding created_at and updated_at columns to templates table...")
+    conn.execute(text("ALTER TABLE templates ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;"))
+    conn.execute(text("ALTER TABLE templates ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;"))
+
+    print("Adding user_id column to email_logs table...")
+    conn.execute(text("ALTER TABLE email_logs ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);"))
+
+    print("Making campaign_id nullable in email_logs table...")
+    conn.execute(text("ALTER TABLE email_logs ALTER COLUMN campaign_id DROP NOT NULL;"))
+
+
+def migration_2_email_logs_indexes(conn):
+    """Composite indexes for the analytics filters (online on PostgreSQL)"""
+    print("Creating email_logs and campaigns indexes...")
+    create_index(conn, "ix_email_logs_user_sent_status", "email_logs", ["user_id", "sent_at", "status"])
+    create_index(conn, "ix_email_logs_campaign_sent_status", "email_logs", ["campaign_id", "sent_at", "status"])
+    create_index(conn, "ix_email_logs_sent_at", "email_logs", ["sent_at"])
+    create_index(conn, "ix_email_logs_recipient_email", "email_logs", ["recipient_email"])
+    create_index(conn, "ix_campaigns_user_id", "campaigns", ["user_id"])
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ANALYZE email_logs;"))
+        conn.execute(text("ANALYZE campaigns;"))
+
+
+def migration_3_partition_email_logs(conn):
+    """Convert email_logs into a table partitioned by month of sent_at (PostgreSQL only)"""
+    from partitions import is_partitioned, create_partition, ensure_partitions, month_start, add_months
+
+    if conn.dialect.name != "postgresql" or is_partitioned(conn):
+        return  # SQLite keeps a single table
+    # The copy and the swap happen in one transaction; writers wait on the table lock
+    with conn.engine.begin() as tx:
+        print("Partitioning email_logs by month...")
+        tx.execute(text("LOCK TABLE email_logs IN ACCESS EXCLUSIVE MODE;"))
+        # The partition key must be NOT NULL to be part of the primary key
+        tx.execute(text("UPDATE email_logs SET sent_at = CURRENT_TIMESTAMP WHERE sent_at IS NULL;"))
+        tx.execute(text("ALTER TABLE email_logs RENAME TO email_logs_unpartitioned;"))
+        tx.execute(text(
+            "CREATE TABLE email_logs (LIKE email_logs_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (sent_at);"
+        ))
+        tx.execute(text("ALTER TABLE email_logs ALTER COLUMN sent_at SET NOT NULL;"))
+        tx.execute(text("ALTER TABLE email_logs ADD FOREIGN KEY (campaign_id) REFERENCES campaigns(id);"))
+        tx.execute(text("ALTER TABLE email_logs ADD FOREIGN KEY (user_id) REFERENCES users(id);"))
+        tx.execute(text("ALTER SEQUENCE IF EXISTS email_logs_id_seq OWNED BY email_logs.id;"))
+
+        oldest = tx.execute(text("SELECT min(sent_at) FROM email_logs_unpartitioned;")).scalar()
+        month = month_start(oldest or datetime.utcnow())
+        while month <= month_start(datetime.utcnow()):
+            create_partition(tx, month)
+            month = add_months(month, 1)
+        ensure_partitions(tx)
+        # Catches rows outside the created ranges (e.g. a far-future sent_at)
+        tx.execute(text("CREATE TABLE email_logs_default PARTITION OF email_logs DEFAULT;"))
+
+        tx.execute(text("INSERT INTO email_logs SELECT * FROM email_logs_unpartitioned;"))
+        tx.execute(text("DROP TABLE email_logs_unpartitioned;"))
+        # Added after the drop so the constraint gets the usual email_logs_pkey name
+        tx.execute(text("ALTER TABLE email_logs ADD PRIMARY KEY (id, sent_at);"))
+
+        # Indexes on the parent cascade to every partition (CONCURRENTLY is not supported here)
+        for name, columns in (
+            ("ix_email_logs_user_sent_status", "user_id, sent_at, status"),
+            ("ix_email_logs_campaign_sent_status", "campaign_id, sent_at, status"),
+            ("ix_email_logs_sent_at", "sent_at"),
+            ("ix_email_logs_recipient_email", "recipient_email"),
+            ("ix_email_logs_id", "id"),
+        ):
+            tx.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON email_logs ({columns});"))
+        tx.execute(text("ANALYZE email_logs;"))
+
+
+def migration_4_campaign_counters(conn):
+    """Per-campaign counter columns, backfilled from email_logs"""
+    from sqlalchemy import inspect
+    from rollups import rebuild_campaign_counters
+
+    existing = {column["name"] for column in inspect(conn).get_columns("campaigns")}
+    print("Adding counter columns to campaigns table...")
+    for column in ("sent_count", "failed_count", "bounced_count"):
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE campaigns ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0;"))
+    if "last_event_at" not in existing:
+        conn.execute(text("ALTER TABLE campaigns ADD COLUMN last_event_at TIMESTAMP;"))
+    rebuild_campaign_counters(conn)
+
+
+def migration_5_event_webhook(conn):
+    """email_logs.message_id for matching SendGrid events, and the suppression list"""
+    from sqlalchemy import inspect
+    from models import EmailSuppression
+
+    if "message_id" not in {column["name"] for column in inspect(conn).get_columns("email_logs")}:
+        print("Adding message_id column to email_logs table...")
+        conn.execute(text("ALTER TABLE email_logs ADD COLUMN message_id VARCHAR;"))
+    create_index(conn, "ix_email_logs_message_id", "email_logs", ["message_id"])
+    print("Creating email_suppressions table...")
+    EmailSuppression.__table__.create(conn, checkfirst=True)
+
+
+# (version, function). Append new migrations at the end; never renumber.
+MIGRATIONS = [
+    (1, migration_1_log_columns),
+    (2, migration_2_email_logs_indexes),
+    (3, migration_3_partition_email_logs),
+    (4, migration_4_campaign_counters),
+    (5, migration_5_event_webhook),
+]
+
+
+def create_schema(engine, strict_partitions=True):
+    """Create missing tables, backfill an empty rollup and add upcoming email_logs partitions
+
+    With strict_partitions=False (app startup) a failure to create a partition is
+    only logged; `python partitions.py maintain` or this script will retry it.
+    """
+    from models import Base
+    from rollups import backfill_if_empty
+    from partitions import ensure_partitions
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        backfill_if_empty(conn)
+    # Monthly email_logs partitions for this month and the next few (PostgreSQL only).
+    # Own transaction, so a failure here does not roll back the backfill.
+    try:
+        with engine.begin() as conn:
+            ensure_partitions(conn)
+    except Exception as e:
+        if strict_partitions:
+            raise
+        print(f"Could not create email_logs partitions, run `python partitions.py maintain`: {e}")
+
+
+def ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn):
+    ensure_migrations_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def migrate_database():
+    from models import Base
+
+    engine = get_engine()
+    # Tables that do not exist yet are created with the current schema; the
+    # migrations below bring older existing tables up to it
+    Base.metadata.create_all(bind=engine)
+    # Autocommit: CREATE INDEX CONCURRENTLY cannot run inside a transaction block,
+    # and each migration is recorded as soon as it has been applied
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        done = applied_versions(conn)
+        pending = [(v, fn) for v, fn in MIGRATIONS if v not in done]
+        if not pending:
+            print("Database schema is up to date.")
+
+        for version, migration in pending:
+            print(f"Applying migration {version}: {migration.__name__}")
+            try:
+                migration(conn)
+            except Exception as e:
+                print(f"Migration {version} failed: {e}")
+                sys.exit(1)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": migration.__name__, "t": datetime.utcnow()},
+            )
+
+    create_schema(engine)
+    if pending:
+        print("Migration completed successfully!")
+
+
+def show_status():
+    engine = get_engine()
     with engine.connect() as conn:
-        try:
-            # Add missing columns to templates table
-            print("Adding created_at and updated_at columns to templates table...")
-            conn.execute(text("ALTER TABLE templates ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;"))
-            conn.execute(text("ALTER TABLE templates ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;"))
-
-            # Add user_id column to email_logs table
-            print("Adding user_id column to email_logs table...")
-            conn.execute(text("ALTER TABLE email_logs ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id);"))
-
-            # Make campaign_id nullable since individual emails don't have campaigns
-            print("Making campaign_id nullable in email_logs table...")
-            conn.execute(text("ALTER TABLE email_logs ALTER COLUMN campaign_id DROP NOT NULL;"))
-
-            print("Migration completed successfully!")
-
-            # Verify the changes
-            result = conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'templates' ORDER BY ordinal_position;"))
-            print("\nUpdated templates table columns:")
-            for row in result:
-                print(f"  - {row[0]}")
-
-            result = conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'email_logs' ORDER BY ordinal_position;"))
-            print("\nUpdated email_logs table columns:")
-            for row in result:
-                print(f"  - {row[0]}")
-            
-            # Commit after successful verification
-            conn.commit()
-
-        except Exception as e:
-            print(f"Migration failed: {e}")
-            conn.rollback()
+        done = applied_versions(conn)
+        conn.commit()
+    for version, migration in MIGRATIONS:
+        state = "applied" if version in done else "pending"
+        print(f"  {version:>3}  {state:<8} {migration.__name__}")
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN wrapper so a SQLAlchemy statement is explained with its bound parameters"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == "sqlite" else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def full_scans(conn, plan_lines):
+    """Plan lines that read email_logs without an index"""
+    if conn.dialect.name == "sqlite":
+        return [line for line in plan_lines if line.startswith("SCAN email_logs") and "INDEX" not in line]
+    return [line for line in plan_lines if "Seq Scan on email_logs" in line]
+
+
+def check_query_plans():
+    # Imported here so plain migrations do not need the app's modules
+    from stats import build_window_query
+    from main import analytics_windows
+
+    engine = get_engine()
+    windows = {"all_time": datetime.min, **analytics_windows()}
+    queries = {
+        "dashboard (email_logs)": build_window_query(1, analytics_windows(), ("sent",), source="logs"),
+        "analytics (email_logs)": build_window_query(1, windows, source="logs"),
+        "analytics (rollup + first-day correction)": build_window_query(1, windows, source="rollup"),
+    }
+
+    failed = False
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Small dev tables make sequential scans look cheaper; ask whether an index *can* be used
+            conn.execute(text("SET enable_seqscan = off"))
+        for name, query in queries.items():
+            rows = conn.execute(Explain(query)).fetchall()
+            plan = [row[-1] if conn.dialect.name == "sqlite" else row[0] for row in rows]
+            scans = full_scans(conn, plan)
+            print(f"\n{name}: {'FULL SCAN' if scans else 'uses indexes'}")
+            for line in plan:
+                print(f"  {line}")
+            failed = failed or bool(scans)
+
+    if failed:
+        print("\nSome dashboard queries scan email_logs without an index - run migrations first.")
+        sys.exit(1)
+    print("\nAll dashboard queries use indexes on email_logs.")
+
 
 if __name__ == "__main__":
-    migrate_database()
\ No newline at end of file
+    if "--status" in sys.argv:
+        show_status()
+    elif "--check-plans" in sys.argv:
+        check_query_plans()
+    else:
+        migrate_database()
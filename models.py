@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -33,12 +33,17 @@ class Campaign(Base):
     __tablename__ = "campaigns"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     name = Column(String)
     template_id = Column(String, ForeignKey("templates.id"))  # Changed to String to match templates.id
     sender_email = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="completed")  # 'draft', 'sending', 'completed', 'failed'
+    # Email counts by status, kept up to date on every EmailLog flush (see rollups.py)
+    sent_count = Column(Integer, nullable=False, default=0, server_default="0")
+    failed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    bounced_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_event_at = Column(DateTime, nullable=True)
 
 class EmailLog(Base):
     __tablename__ = "email_logs"
@@ -49,4 +54,32 @@ class EmailLog(Base):
     recipient_email = Column(String)
     status = Column(String, default="sent")  # 'sent', 'failed', 'bounced'
     sent_at = Column(DateTime, default=datetime.utcnow)
-    error_message = Column(Text, nullable=True)
\ No newline at end of file
+    error_message = Column(Text, nullable=True)
+    message_id = Column(String, nullable=True)  # SendGrid X-Message-Id, matched by the event webhook
+
+    # Existing databases get these through migrate_db.py (migrations 2 and 5)
+    __table_args__ = (
+        Index("ix_email_logs_user_sent_status", "user_id", "sent_at", "status"),
+        Index("ix_email_logs_campaign_sent_status", "campaign_id", "sent_at", "status"),
+        Index("ix_email_logs_sent_at", "sent_at"),
+        Index("ix_email_logs_recipient_email", "recipient_email"),
+        Index("ix_email_logs_message_id", "message_id"),
+    )
+
+class EmailSuppression(Base):
+    __tablename__ = "email_suppressions"
+
+    # Recipients that bounced, were dropped, reported spam or unsubscribed (fed by the event webhook)
+    email = Column(String, primary_key=True)  # Lower-cased
+    reason = Column(String)  # SendGrid event type: 'bounce', 'dropped', 'spamreport', 'unsubscribe', ...
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class EmailStatsRollup(Base):
+    __tablename__ = "email_stats_rollup"
+
+    # Pre-aggregated email_logs counts, maintained incrementally by rollups.py
+    user_id = Column(Integer, primary_key=True)  # Owner: the campaign's user, or EmailLog.user_id
+    campaign_id = Column(Integer, primary_key=True, default=0)  # 0 = individual emails (no campaign)
+    day = Column(Date, primary_key=True)  # UTC day of sent_at
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
\ No newline at end of file
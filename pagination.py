@@ -0,0 +1,49 @@
+import os
+
+from sqlalchemy import select
+
+# Keyset (cursor) pagination for the list endpoints. Pages are ordered by the
+# primary key and continue with "WHERE id > :after LIMIT :limit + 1", so every
+# page is one index range scan no matter how deep the client has paged, unlike
+# OFFSET, which reads and discards all earlier rows. The response body stays a
+# plain JSON array; the cursor for the next page travels in NEXT_CURSOR_HEADER
+# (and a Link: rel="next" header) and is absent on the last page.
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+LIST_PAGE_SIZE_MAX = int(os.getenv("LIST_PAGE_SIZE_MAX", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def parse_fields(fields, model, allowed, key="id"):
+    """Columns named in a comma separated ?fields= list; None means the full object"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    if key not in names:
+        names.insert(0, key)  # The key is always returned, clients need it to page
+    return [getattr(model, name) for name in dict.fromkeys(names)]
+
+
+def keyset_page(db, model, limit, after=None, filters=(), columns=None):
+    """One page of rows ordered by primary key, and the cursor of the next page (or None)"""
+    key = model.__mapper__.primary_key[0]
+    query = select(*columns) if columns else select(model)
+    query = query.where(*filters).order_by(key).limit(limit + 1)
+    if after is not None:
+        query = query.where(key > after)
+    result = db.execute(query)
+    rows = result.mappings().all() if columns else result.scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, str(last[key.key] if columns else getattr(last, key.key))
+
+
+def page_headers(request, next_cursor):
+    if next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(after=next_cursor)
+    return {NEXT_CURSOR_HEADER: next_cursor, "Link": f'<{next_url}>; rel="next"'}
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import os
+import re
+import csv
+import sys
+import gzip
+from datetime import datetime
+
+from sqlalchemy import text, select, delete, func, insert
+
+from models import EmailLog
+
+# Monthly partitions of email_logs. On PostgreSQL email_logs is a table
+# partitioned by RANGE (sent_at), one partition per UTC month plus a DEFAULT
+# partition (migrate_db.py migration 3 converts the table). SQLite keeps a
+# single table. Months older than the retention period are written to a
+# gzipped CSV archive and then dropped (PostgreSQL) or deleted (SQLite).
+# Archived rows stay counted in email_stats_rollup, so all-time analytics do
+# not change when a month is archived.
+#
+#   python partitions.py maintain          create upcoming partitions, archive expired months
+#   python partitions.py list              partitions / months with row counts
+#   python partitions.py restore YYYY-MM   load an archived month back into email_logs
+
+EMAIL_LOG_RETENTION_MONTHS = int(os.getenv("EMAIL_LOG_RETENTION_MONTHS", "12"))
+EMAIL_LOG_ARCHIVE_DIR = os.getenv("EMAIL_LOG_ARCHIVE_DIR", "archive")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+email_logs = EmailLog.__table__
+ARCHIVE_COLUMNS = [c.name for c in email_logs.columns]
+PARTITION_NAME = re.compile(r"^email_logs_p(\d{4})(\d{2})$")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"email_logs_p{month:%Y%m}"
+
+
+def archive_path(month, archive_dir=EMAIL_LOG_ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"email_logs_{month:%Y_%m}.csv.gz")
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('email_logs')"
+    )).first() is not None
+
+
+def partition_months(conn):
+    """Months that currently have their own partition"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'email_logs'::regclass"
+    ))
+    months = []
+    for (name,) in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(conn, month):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF email_logs "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    ))
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Create partitions for the current month and the next few (no-op unless partitioned)"""
+    if not is_partitioned(conn):
+        return []
+    existing = set(partition_months(conn))
+    current = month_start(datetime.utcnow())
+    created = []
+    for n in range(months_ahead + 1):
+        month = add_months(current, n)
+        if month not in existing:
+            create_partition(conn, month)
+            created.append(month)
+    return created
+
+
+def _month_rows(conn, month):
+    return select(email_logs).where(
+        email_logs.c.sent_at >= month, email_logs.c.sent_at < add_months(month, 1)
+    ).order_by(email_logs.c.id)
+
+
+def export_month(conn, month, archive_dir=EMAIL_LOG_ARCHIVE_DIR):
+    """Write one month of email_logs to a gzipped CSV; returns the row count"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = archive_path(month, archive_dir)
+
+    # Temp file + rename so a crash never leaves a truncated archive behind. A
+    # month that was restored is re-exported in full, so replacing is safe.
+    tmp_path = f"{path}.tmp"
+    count = 0
+    result = conn.execution_options(stream_results=True, yield_per=1000).execute(_month_rows(conn, month))
+    with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_COLUMNS)
+        for row in result:
+            writer.writerow(["" if v is None else v.isoformat() if isinstance(v, datetime) else v for v in row])
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def archive_month(conn, month, archive_dir=EMAIL_LOG_ARCHIVE_DIR):
+    """Export a month, then drop its partition (PostgreSQL) or delete its rows (SQLite)"""
+    count = export_month(conn, month, archive_dir)
+    if is_partitioned(conn) and month in partition_months(conn):
+        conn.execute(text(f"DROP TABLE {partition_name(month)}"))
+    else:
+        conn.execute(delete(email_logs).where(
+            email_logs.c.sent_at >= month, email_logs.c.sent_at < add_months(month, 1)
+        ))
+    return count
+
+
+def expired_months(conn, retention_months=EMAIL_LOG_RETENTION_MONTHS):
+    """Months entirely older than the retention period that still hold data"""
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    if is_partitioned(conn):
+        return [m for m in partition_months(conn) if m < cutoff]
+    oldest = conn.execute(select(func.min(email_logs.c.sent_at))).scalar()
+    if oldest is None:
+        return []
+    months = []
+    month = month_start(oldest if isinstance(oldest, datetime) else datetime.fromisoformat(oldest))
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_expired(engine, retention_months=EMAIL_LOG_RETENTION_MONTHS, archive_dir=EMAIL_LOG_ARCHIVE_DIR):
+    """Archive every expired month, each in its own transaction"""
+    with engine.connect() as conn:
+        months = expired_months(conn, retention_months)
+    archived = {}
+    for month in months:
+        with engine.begin() as conn:
+            archived[month] = archive_month(conn, month, archive_dir)
+    return archived
+
+
+def _parse_archive_value(column, value):
+    if value == "":
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
+
+
+def iter_archive(month, archive_dir=EMAIL_LOG_ARCHIVE_DIR):
+    """Rows of an archived month as dicts keyed by email_logs column names"""
+    with gzip.open(archive_path(month, archive_dir), "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [email_logs.c[name] for name in header]
+        for values in reader:
+            yield {c.name: _parse_archive_value(c, v) for c, v in zip(columns, values)}
+
+
+def restore_month(conn, month, archive_dir=EMAIL_LOG_ARCHIVE_DIR, batch_size=1000):
+    """Load an archived month back into email_logs (the rollup already counts these rows)"""
+    if is_partitioned(conn):
+        create_partition(conn, month)
+    batch = []
+    count = 0
+    for row in iter_archive(month, archive_dir):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(insert(email_logs), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(email_logs), batch)
+        count += len(batch)
+    return count
+
+
+def list_months(conn):
+    month = func.date_trunc("month", email_logs.c.sent_at) if conn.dialect.name == "postgresql" \
+        else func.strftime("%Y-%m", email_logs.c.sent_at)
+    rows = conn.execute(select(month, func.count()).group_by(month).order_by(month)).all()
+    partitions = {m.strftime("%Y-%m") for m in partition_months(conn)} if is_partitioned(conn) else set()
+    for value, count in rows:
+        label = value.strftime("%Y-%m") if isinstance(value, datetime) else str(value)
+        where = "partition" if label in partitions else ("default partition" if partitions else "table")
+        print(f"  {label}  {count:>10}  {where}")
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "maintain":
+        with engine.begin() as conn:
+            for month in ensure_partitions(conn):
+                print(f"Created partition {partition_name(month)}")
+        for month, count in archive_expired(engine).items():
+            print(f"Archived {count} rows of {month:%Y-%m} to {archive_path(month)}")
+    elif command == "list":
+        with engine.connect() as conn:
+            list_months(conn)
+    elif command == "restore" and len(sys.argv) == 3:
+        month = datetime.strptime(sys.argv[2], "%Y-%m")
+        with engine.begin() as conn:
+            print(f"Restored {restore_month(conn, month)} rows of {month:%Y-%m}")
+    else:
+        print("Usage: python partitions.py maintain | list | restore YYYY-MM")
+        sys.exit(1)
@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# bcrypt hashing and verification on a small dedicated thread pool. The bcrypt
+# C extension releases the GIL, so threads give real parallelism, and the event
+# loop keeps serving validation and send traffic while a login is checked.
+# Work beyond PASSWORD_MAX_PENDING waiting calls is rejected (PasswordPoolBusy)
+# so a login storm degrades into fast 503s instead of an ever-growing queue.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "32"))
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations are already queued"""
+
+
+class PasswordHasher:
+    def __init__(self, context, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_MAX_PENDING):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._queued = 0  # submitted and not yet finished (running + waiting)
+        self._latencies = deque(maxlen=1000)  # seconds from submit to result
+        self.completed = 0
+        self.rejected = 0
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._queued >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self._queued += 1
+        submitted = time.monotonic()
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._queued -= 1
+                    self.completed += 1
+                    self._latencies.append(time.monotonic() - submitted)
+
+        return self._executor.submit(run)
+
+    async def verify(self, password, hashed):
+        return await asyncio.wrap_future(self._submit(self.context.verify, password, hashed))
+
+    async def hash(self, password):
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    # For sync (def) endpoints, which already run in the threadpool but share the same limit
+    def verify_sync(self, password, hashed):
+        return self._submit(self.context.verify, password, hashed).result()
+
+    def hash_sync(self, password):
+        return self._submit(self.context.hash, password).result()
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+            queued = self._queued
+        in_flight = min(queued, self.workers)
+
+        def percentile(pct):
+            if not samples:
+                return None
+            index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+            return round(samples[index] * 1000, 1)
+
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": in_flight,
+            "pending": queued - in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_ms": percentile(50),
+            "latency_p95_ms": percentile(95),
+        }
@@ -0,0 +1,127 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import Response
+from sqlalchemy import event
+
+from models import Campaign, EmailLog
+from rollups import campaign_owners
+from fast_json import dumps
+
+# Per-user cache of rendered /analytics and /dashboard/stats responses.
+# Each user has a data version that is bumped after any commit touching their
+# EmailLog or Campaign rows; cached bodies are only served for the version they
+# were computed at. The TTL bounds staleness from writes made by other worker
+# processes (whose bumps this process never sees) and from rolling windows.
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "30"))  # seconds
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "10000"))
+
+
+class CachedBody:
+    __slots__ = ("body", "etag", "version", "stored_at", "headers")
+
+    def __init__(self, body, version, headers=None):
+        self.body = body
+        self.headers = headers or {}  # extra response headers, e.g. the next page cursor
+        self.etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.version = version
+        self.stored_at = time.monotonic()
+
+
+class UserResponseCache:
+    def __init__(self, ttl=ANALYTICS_CACHE_TTL, max_entries=ANALYTICS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._versions = {}
+        self._entries = OrderedDict()  # (kind, user_id) -> CachedBody
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump(self, user_ids):
+        """Invalidate every cached response of these users"""
+        with self._lock:
+            for user_id in user_ids:
+                if user_id is not None:
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def lookup(self, kind, user_id):
+        """Fresh cached body for the user's current data version, or None"""
+        with self._lock:
+            entry = self._entries.get((kind, user_id))
+            if entry is None:
+                return None
+            if entry.version != self._versions.get(user_id, 0) or time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[(kind, user_id)]
+                return None
+            self._entries.move_to_end((kind, user_id))
+            return entry
+
+    def store(self, kind, user_id, version, payload, headers=None):
+        """Render a response model to JSON and cache it under the version read before computing it"""
+        body = dumps(payload)
+        entry = CachedBody(body, version, headers)
+        with self._lock:
+            self._entries[(kind, user_id)] = entry
+            self._entries.move_to_end((kind, user_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def cached_response(request, entry):
+    """200 with the cached body, or 304 when the client already has this ETag"""
+    # no-cache: the browser keeps the body but revalidates with If-None-Match every time
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _changed_user_ids(session):
+    user_ids = set()
+    campaign_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, EmailLog):
+            user_ids.add(obj.user_id)
+            if obj.campaign_id:
+                campaign_ids.add(obj.campaign_id)
+        elif isinstance(obj, Campaign):
+            user_ids.add(obj.user_id)
+    if campaign_ids:
+        user_ids.update(campaign_owners(session.connection(), campaign_ids).values())
+    user_ids.discard(None)
+    return user_ids
+
+
+def register_invalidation_listeners(cache, target):
+    """Bump the users' versions after a commit that changed their logs or campaigns"""
+
+    def after_flush(session, flush_context):
+        changed = _changed_user_ids(session)
+        if changed:
+            session.info.setdefault("changed_user_ids", set()).update(changed)
+
+    def after_commit(session):
+        changed = session.info.pop("changed_user_ids", None)
+        if changed:
+            cache.bump(changed)
+
+    def after_rollback(session):
+        session.info.pop("changed_user_ids", None)
+
+    event.listen(target, "after_flush", after_flush)
+    event.listen(target, "after_commit", after_commit)
+    event.listen(target, "after_rollback", after_rollback)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, select, delete, update, func, and_, inspect, bindparam
+from sqlalchemy.orm import Session
+
+from models import Campaign, EmailLog, EmailStatsRollup
+
+# email_stats_rollup holds COUNT(*) of email_logs per (owner, campaign, UTC day,
+# status). It is kept up to date from the ORM flush of every EmailLog insert,
+# status change and delete, so /analytics and /dashboard/stats read
+# pre-aggregated rows instead of scanning email_logs (queries live in stats.py).
+# The same flush hook keeps the per-campaign counter columns on campaigns
+# (sent_count, failed_count, bounced_count) in step with email_logs.
+
+rollup_table = EmailStatsRollup.__table__
+ROLLUP_KEY = ("user_id", "campaign_id", "day", "status")
+
+campaigns_table = Campaign.__table__
+# EmailLog.status -> counter column on campaigns
+COUNTER_COLUMNS = {
+    "sent": "sent_count",
+    "failed": "failed_count",
+    "bounced": "bounced_count",
+}
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def campaign_owners(connection, campaign_ids):
+    if not campaign_ids:
+        return {}
+    rows = connection.execute(select(Campaign.id, Campaign.user_id).where(Campaign.id.in_(campaign_ids)))
+    return {campaign_id: user_id for campaign_id, user_id in rows}
+
+
+def _collect_deltas(session):
+    """(EmailLog, status, +1/-1) tuples for everything this flush changes"""
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, EmailLog):
+            changes.append((obj, obj.status, 1))
+    for obj in session.dirty:
+        if isinstance(obj, EmailLog):
+            history = inspect(obj).attrs.status.history
+            if history.has_changes():
+                for old_status in history.deleted:
+                    changes.append((obj, old_status, -1))
+                for new_status in history.added:
+                    changes.append((obj, new_status, 1))
+    for obj in session.deleted:
+        if isinstance(obj, EmailLog):
+            changes.append((obj, obj.status, -1))
+    return changes
+
+
+def apply_rollup_deltas(connection, deltas):
+    """Add {(user_id, campaign_id, day, status): delta} to the rollup with an upsert"""
+    rows = [dict(zip(ROLLUP_KEY, key), count=n) for key, n in deltas.items() if n and key[0] is not None]
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(rollup_table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEY),
+            set_={"count": rollup_table.c.count + stmt.excluded.count},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    # Generic fallback: update, then insert the keys that did not exist yet
+    for row in rows:
+        key_filter = and_(*[rollup_table.c[k] == row[k] for k in ROLLUP_KEY])
+        result = connection.execute(
+            rollup_table.update().where(key_filter).values(count=rollup_table.c.count + row["count"])
+        )
+        if result.rowcount == 0:
+            connection.execute(rollup_table.insert().values(**row))
+
+
+def log_deltas(connection, changes):
+    """Turn (EmailLog-like, status, sign) changes into rollup deltas"""
+    owners = campaign_owners(connection, {log.campaign_id for log, _, _ in changes if log.campaign_id})
+    deltas = defaultdict(int)
+    for log, status, sign in changes:
+        # Campaign emails belong to the campaign owner, individual emails to their sender
+        user_id = owners.get(log.campaign_id) if log.campaign_id else None
+        if user_id is None:
+            user_id = log.user_id
+        deltas[(user_id, log.campaign_id or 0, _day(log.sent_at), status)] += sign
+    return deltas
+
+
+def counter_deltas(changes):
+    """{campaign_id: {counter_column: delta}} for campaign emails among the changes"""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS.values(), 0))
+    for log, status, sign in changes:
+        if log.campaign_id and status in COUNTER_COLUMNS:
+            deltas[log.campaign_id][COUNTER_COLUMNS[status]] += sign
+    return deltas
+
+
+def apply_counter_deltas(connection, deltas, event_at=None):
+    """Increment the campaigns' counters in the database (atomic under concurrent writers)"""
+    rows = [dict(counts, b_id=campaign_id) for campaign_id, counts in deltas.items() if any(counts.values())]
+    if not rows:
+        return
+    values = {column: campaigns_table.c[column] + bindparam(column) for column in COUNTER_COLUMNS.values()}
+    values["last_event_at"] = event_at or datetime.utcnow()
+    stmt = update(campaigns_table).where(campaigns_table.c.id == bindparam("b_id")).values(**values)
+    connection.execute(stmt, rows)
+
+
+def _after_flush(session, flush_context):
+    changes = _collect_deltas(session)
+    if changes:
+        connection = session.connection()
+        apply_rollup_deltas(connection, log_deltas(connection, changes))
+        apply_counter_deltas(connection, counter_deltas(changes))
+
+
+def _status_set(target, value, oldvalue, initiator):
+    return value
+
+
+def register_rollup_listeners(target=Session):
+    """Maintain the rollup on every flush of the given Session class/sessionmaker"""
+    if not event.contains(target, "after_flush", _after_flush):
+        event.listen(target, "after_flush", _after_flush)
+    # active_history loads the previous status of expired objects on assignment,
+    # otherwise a status change after commit() has no "deleted" side to decrement
+    if not event.contains(EmailLog.status, "set", _status_set):
+        event.listen(EmailLog.status, "set", _status_set, active_history=True, retval=True)
+
+
+def rebuild_rollups(connection):
+    """Recompute the whole rollup from email_logs (initial backfill or repair)"""
+    owner = func.coalesce(Campaign.user_id, EmailLog.user_id)
+    day = func.date(EmailLog.sent_at)
+    campaign = func.coalesce(EmailLog.campaign_id, 0)
+    aggregated = (
+        select(owner, campaign, day, EmailLog.status, func.count())
+        .select_from(EmailLog)
+        .outerjoin(Campaign, Campaign.id == EmailLog.campaign_id)
+        .where(owner.isnot(None), EmailLog.sent_at.isnot(None))
+        .group_by(owner, campaign, day, EmailLog.status)
+    )
+    connection.execute(delete(rollup_table))
+    connection.execute(rollup_table.insert().from_select(list(ROLLUP_KEY) + ["count"], aggregated))
+
+
+def rebuild_campaign_counters(connection):
+    """Recompute every campaign's counters from email_logs"""
+    values = {}
+    for status, column in COUNTER_COLUMNS.items():
+        values[column] = select(func.count()).where(
+            EmailLog.campaign_id == campaigns_table.c.id, EmailLog.status == status
+        ).scalar_subquery()
+    values["last_event_at"] = select(func.max(EmailLog.sent_at)).where(
+        EmailLog.campaign_id == campaigns_table.c.id
+    ).scalar_subquery()
+    connection.execute(update(campaigns_table).values(**values))
+
+
+def backfill_if_empty(connection):
+    """Populate the rollup on first deploy, when it is empty but email_logs is not"""
+    has_rollups = connection.execute(select(rollup_table.c.user_id).limit(1)).first()
+    if not has_rollups and connection.execute(select(EmailLog.id).limit(1)).first():
+        rebuild_rollups(connection)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python rollups.py rebuild")
+        sys.exit(1)
+    from database import engine
+    from models import Base
+    Base.metadata.create_all(bind=engine, tables=[rollup_table])
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+        rebuild_campaign_counters(conn)
+    print("email_stats_rollup and campaign counters rebuilt from email_logs")
@@ -54,6 +54,7 @@ class EmailRequest(BaseModel):
     to_email: EmailStr
     subject: str
     body: str
+    campaign_id: Optional[int] = None  # Count the email towards one of the user's campaigns
 
 # Template schemas
 class TemplateBase(BaseModel):
@@ -94,6 +95,10 @@ class Campaign(CampaignBase):
     user_id: int
     created_at: Optional[datetime]
     status: str
+    sent_count: int = 0
+    failed_count: int = 0
+    bounced_count: int = 0
+    last_event_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -153,6 +158,26 @@ class ComprehensiveAnalytics(BaseModel):
     campaign_emails: int
     individual_emails: int
 
+class CampaignStats(BaseModel):
+    campaign_id: int
+    name: Optional[str]
+    status: Optional[str]
+    sent: int
+    failed: int
+    bounced: int
+    total: int
+    delivery_rate: float  # Percentage
+    last_event_at: Optional[datetime] = None
+
+class TimeSeriesAnalytics(BaseModel):
+    bucket: str                # hour | day | week
+    campaign_id: Optional[int] = None
+    buckets: List[datetime]    # Start of each bucket (UTC), one entry per bucket even when empty
+    sent: List[int]            # Counts aligned with buckets
+    failed: List[int]
+    bounced: List[int]
+    total: List[int]
+
 # Email validation
 class EmailValidationRequest(BaseModel):
     emails: List[str]
@@ -160,7 +185,9 @@ class EmailValidationRequest(BaseModel):
 class EmailValidationResult(BaseModel):
     email: str
     valid: bool
+    deliverable: bool = False
     reason: Optional[str] = None
+    suggestion: Optional[str] = None  # Corrected address when the domain looks like a typo
 
 class EmailValidationResponse(BaseModel):
     results: List[EmailValidationResult]
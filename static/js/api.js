@@ -32,6 +32,20 @@ const API = {
         }
     },
 
+    // Walks a keyset-paginated list endpoint (limit / after) and returns every item
+    async fetchAll(url, pageSize = 500) {
+        const items = [];
+        const separator = url.includes('?') ? '&' : '?';
+        let after = null;
+        while (true) {
+            const cursor = after === null ? '' : `&after=${encodeURIComponent(after)}`;
+            const page = await API.fetch(`${url}${separator}limit=${pageSize}${cursor}`);
+            items.push(...page);
+            if (page.length < pageSize) return items;
+            after = page[page.length - 1].id;
+        }
+    },
+
     async sendEmail(fromEmail, toEmail, subject, body) {
         return await API.fetch('/api/send-email', {
             method: 'POST',
@@ -47,7 +61,7 @@ const API = {
     },
 
     async getTemplates() {
-        return await API.fetch('/templates');
+        return await API.fetchAll('/templates');
     },
 
     async createTemplate(template) {
@@ -109,7 +109,7 @@ const Admin = {
         userListTable.innerHTML = '<tr><td colspan="5" class="text-center p-4">Loading...</td></tr>';
 
         try {
-            const users = await API.fetch('/admin/users');
+            const users = await API.fetchAll('/admin/users');
             this.cachedUsers = users; // Cache users for edit functionality
             userListTable.innerHTML = '';
             users.forEach(user => {
@@ -172,7 +172,7 @@ const Admin = {
             // Use cached users if available, otherwise fetch
             let users = this.cachedUsers;
             if (!users) {
-                users = await API.fetch('/admin/users');
+                users = await API.fetchAll('/admin/users');
                 this.cachedUsers = users;
             }
             const user = users.find(u => u.id === userId);
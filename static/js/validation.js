@@ -279,7 +279,9 @@ const Validation = {
                     ...clientResult,
                     valid: serverResult.valid,
                     deliverable: serverResult.deliverable || false,
-                    reason: serverResult.deliverable ? 'Deliverable' : serverResult.reason || clientResult.reason
+                    reason: serverResult.deliverable ? 'Deliverable' :
+                        serverResult.suggestion ? `${serverResult.reason} - did you mean ${serverResult.suggestion}?` :
+                        serverResult.reason || clientResult.reason
                 };
             }
 
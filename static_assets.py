@@ -0,0 +1,88 @@
+import os
+import re
+import mimetypes
+from email.utils import parsedate_to_datetime
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+# Serving for the output of build_assets.py. A request for a file that has a
+# .br / .gz sibling gets the precompressed bytes when Accept-Encoding allows,
+# with Content-Encoding and Vary set. Fingerprinted names (app.<hash>.js) never
+# change content, so browsers may keep them for a year without revalidating;
+# everything else, index.html included, is revalidated with its ETag.
+STATIC_DIR = "static"
+DIST_INDEX = os.path.join(STATIC_DIR, "dist", "index.html")
+SOURCE_INDEX = "index.html"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))  # preferred first
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{12}\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def accepted_encodings(accept_encoding):
+    """Codings listed in Accept-Encoding, minus those refused with q=0"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip())
+    return accepted
+
+
+def precompressed_variant(path, accept_encoding):
+    """(path to serve, Content-Encoding or None, whether any variant exists)"""
+    accepted = accepted_encodings(accept_encoding)
+    has_variants = False
+    for coding, suffix in PRECOMPRESSED:
+        if os.path.isfile(path + suffix):
+            has_variants = True
+            if coding in accepted or "*" in accepted:
+                return path + suffix, coding, True
+    return path, None, has_variants
+
+
+def is_not_modified(response_headers, request_headers):
+    """Conditional GET check, as StaticFiles does it: If-None-Match first, then If-Modified-Since"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        etag = response_headers["etag"]
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    try:
+        if_modified_since = parsedate_to_datetime(request_headers["if-modified-since"])
+        last_modified = parsedate_to_datetime(response_headers["last-modified"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return if_modified_since >= last_modified
+
+
+def asset_response(path, request_headers, status_code=200):
+    """FileResponse for path, precompressed if possible, with caching headers and 304 handling"""
+    served_path, coding, has_variants = precompressed_variant(path, request_headers.get("accept-encoding", ""))
+    media_type = mimetypes.guess_type(path)[0] or "text/plain"
+    response = FileResponse(served_path, status_code=status_code, media_type=media_type,
+                            stat_result=os.stat(served_path))
+    if coding:
+        response.headers["Content-Encoding"] = coding
+    if has_variants:
+        response.headers["Vary"] = "Accept-Encoding"
+    fingerprinted = FINGERPRINTED.search(os.path.basename(path))
+    response.headers["Cache-Control"] = IMMUTABLE if fingerprinted else REVALIDATE
+    if is_not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+def index_response(request):
+    """The built index.html when build_assets.py has run, else the source one"""
+    path = DIST_INDEX if os.path.isfile(DIST_INDEX) else SOURCE_INDEX
+    return asset_response(path, request.headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        return asset_response(full_path, Headers(scope=scope), status_code)
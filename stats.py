@@ -0,0 +1,221 @@
+import os
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select, func, and_, exists, literal, union_all
+
+from models import Campaign, EmailLog, EmailStatsRollup
+
+# Shared query layer for the dashboard and analytics endpoints. Every
+# window x status combination is computed as a conditional aggregate
+# (COUNT(*) FILTER (WHERE ...)) of a single SELECT, and campaign ownership is
+# resolved with a join on campaigns instead of an IN (...) list built in Python.
+# build_window_query() is also what migrate_db.py --check-plans EXPLAINs.
+
+# "rollup" reads email_stats_rollup (see rollups.py), "logs" scans email_logs
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "rollup")
+
+STATUSES = ("sent", "failed", "bounced")
+
+# Time-series bucket widths; weeks start on Monday (like PostgreSQL date_trunc)
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+MAX_TIMESERIES_BUCKETS = 5000
+
+
+def _day_start(value):
+    return datetime.combine(value.date(), datetime.min.time())
+
+
+def _key(window, status):
+    return f"{window}__{status}"
+
+
+def owned_logs(user_id, attribution="logs"):
+    """email_logs rows belonging to a user, as an index-friendly UNION ALL subquery.
+
+    One branch reaches the rows through the user's campaigns (campaigns.user_id,
+    then email_logs.campaign_id), the other through email_logs.user_id, so both
+    can be answered from indexes instead of an OR that forces a full scan.
+    ``attribution`` decides who owns a row sent by one user for another user's
+    campaign: "logs" counts it for both (the original endpoint semantics),
+    "rollup" only for the campaign owner (how email_stats_rollup attributes it).
+    """
+    columns = (EmailLog.sent_at, EmailLog.status, EmailLog.campaign_id)
+    via_campaign = select(*columns, literal(True).label("via_campaign")).join(
+        Campaign, Campaign.id == EmailLog.campaign_id
+    ).where(Campaign.user_id == user_id)
+
+    if attribution == "rollup":
+        owned_elsewhere = and_(Campaign.id == EmailLog.campaign_id, Campaign.user_id.isnot(None))
+    else:
+        owned_elsewhere = and_(Campaign.id == EmailLog.campaign_id, Campaign.user_id == user_id)
+    direct = select(*columns, literal(False).label("via_campaign")).where(
+        EmailLog.user_id == user_id, ~exists().where(owned_elsewhere)
+    )
+    return union_all(via_campaign, direct).subquery("owned_logs")
+
+
+def _from_logs(user_id, windows, statuses):
+    """Columns over email_logs for every window x status, plus campaign/individual totals"""
+    logs = owned_logs(user_id)
+    columns = []
+    for window, start in windows.items():
+        for status in statuses:
+            condition = logs.c.status == status
+            if start > datetime.min:
+                condition = and_(logs.c.sent_at >= start, condition)
+            columns.append(func.count().filter(condition).label(_key(window, status)))
+    columns.append(func.count().filter(logs.c.via_campaign == True).label("campaign"))  # noqa: E712
+    columns.append(func.count().filter(
+        and_(logs.c.via_campaign == False, logs.c.campaign_id.is_(None))  # noqa: E712
+    ).label("individual"))
+    query = select(*columns).select_from(logs)
+    earliest = min(windows.values())
+    if earliest > datetime.min:
+        # Only recent windows: bound sent_at so PostgreSQL prunes to the hot partitions
+        # (campaign/individual totals then cover the same range)
+        query = query.where(logs.c.sent_at >= earliest)
+    return query
+
+
+def _from_rollup(user_id, windows, statuses):
+    """Same columns, summed from the daily rollup.
+
+    Windows that start mid-day (e.g. "now - 7 days") also get a scalar subquery
+    counting the slice of their first day before the start, which is subtracted
+    so the result matches a scan of email_logs exactly.
+    """
+    R = EmailStatsRollup
+    columns = []
+    for window, start in windows.items():
+        partial = start > datetime.min and start != _day_start(start)
+        for status in statuses:
+            condition = R.status == status
+            if start > datetime.min:
+                condition = and_(R.day >= start.date(), condition)
+            column = func.coalesce(func.sum(R.count).filter(condition), 0)
+            if partial:
+                logs = owned_logs(user_id, "rollup")
+                before_start = select(func.count()).select_from(logs).where(
+                    logs.c.status == status,
+                    logs.c.sent_at >= _day_start(start),
+                    logs.c.sent_at < start,
+                ).scalar_subquery()
+                column = column - before_start
+            columns.append(column.label(_key(window, status)))
+    columns.append(func.coalesce(func.sum(R.count).filter(R.campaign_id != 0), 0).label("campaign"))
+    columns.append(func.coalesce(func.sum(R.count).filter(R.campaign_id == 0), 0).label("individual"))
+    return select(*columns).where(R.user_id == user_id)
+
+
+def build_window_query(user_id, windows, statuses=STATUSES, source=None):
+    source = source or ANALYTICS_SOURCE
+    build = _from_rollup if source == "rollup" else _from_logs
+    return build(user_id, windows, statuses)
+
+
+def window_status_counts(db, user_id, windows, statuses=STATUSES, extra_columns=None, source=None):
+    """Per-window status counts for a user in one round trip.
+
+    ``windows`` maps a name to a naive UTC start datetime (``datetime.min`` for
+    all time). ``extra_columns`` are additional scalar subqueries evaluated in
+    the same statement. Returns ({window: {status: n}}, {"campaign": n,
+    "individual": n}, {extra_name: value}).
+    """
+    query = build_window_query(user_id, windows, statuses, source)
+    extra_columns = extra_columns or {}
+    if extra_columns:
+        query = query.add_columns(*[column.label(name) for name, column in extra_columns.items()])
+
+    row = db.execute(query).mappings().one()
+    counts = {window: {status: int(row[_key(window, status)] or 0) for status in statuses} for window in windows}
+    sources = {"campaign": int(row["campaign"] or 0), "individual": int(row["individual"] or 0)}
+    extras = {name: row[name] for name in extra_columns}
+    return counts, sources, extras
+
+
+def campaign_count_column(user_id):
+    """Scalar subquery: number of campaigns owned by the user"""
+    return select(func.count()).select_from(Campaign).where(Campaign.user_id == user_id).scalar_subquery()
+
+
+def bucket_start(value, bucket):
+    """Start of the hour/day/week containing a naive UTC datetime"""
+    if bucket == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = _day_start(value)
+    if bucket == "week":
+        day -= timedelta(days=day.weekday())
+    return day
+
+
+def _as_datetime(value):
+    """Bucket keys come back as datetime (PostgreSQL), date or text (SQLite)"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return datetime.fromisoformat(value)
+
+
+def _bucket_expression(column, bucket, dialect):
+    if dialect == "postgresql":
+        return func.date_trunc(bucket, column)
+    if bucket == "hour":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    if bucket == "week":
+        return func.date(column, "weekday 0", "-6 days")  # Monday of the week
+    return func.date(column)
+
+
+def _timeseries_from_logs(user_id, bucket, start, end, campaign_id, dialect):
+    logs = owned_logs(user_id)
+    key = _bucket_expression(logs.c.sent_at, bucket, dialect).label("bucket")
+    query = select(key, logs.c.status, func.count()).where(
+        logs.c.sent_at >= start, logs.c.sent_at < end, logs.c.status.in_(STATUSES)
+    )
+    if campaign_id is not None:
+        query = query.where(logs.c.campaign_id == campaign_id)
+    return query.group_by(key, logs.c.status)
+
+
+def _timeseries_from_rollup(user_id, start, end, campaign_id):
+    R = EmailStatsRollup
+    query = select(R.day, R.status, func.sum(R.count)).where(
+        R.user_id == user_id, R.day >= start.date(), R.day < end.date(), R.status.in_(STATUSES)
+    )
+    if campaign_id is not None:
+        query = query.where(R.campaign_id == campaign_id)
+    return query.group_by(R.day, R.status)
+
+
+def timeseries_counts(db, user_id, bucket, start, end, campaign_id=None, source=None):
+    """Dense per-bucket status counts for the buckets from the one containing
+    ``start`` through the one containing ``end`` (naive UTC), in one query.
+
+    Day and week buckets are summed from the daily rollup; hourly buckets (and
+    source="logs") group email_logs with date_trunc / strftime. Returns
+    ([bucket start, ...], {status: [count, ...]}).
+    """
+    step = BUCKETS[bucket]
+    first = bucket_start(start, bucket)
+    stop = bucket_start(end, bucket) + step
+    starts = []
+    current = first
+    while current < stop:
+        starts.append(current)
+        current += step
+
+    source = source or ANALYTICS_SOURCE
+    if source == "rollup" and bucket != "hour":
+        query = _timeseries_from_rollup(user_id, first, stop, campaign_id)
+    else:
+        query = _timeseries_from_logs(user_id, bucket, first, stop, campaign_id, db.get_bind().dialect.name)
+
+    totals = defaultdict(int)
+    for key, status, count in db.execute(query):
+        # Rollup rows are daily; fold them into their week here
+        totals[(bucket_start(_as_datetime(key), bucket), status)] += int(count or 0)
+
+    series = {status: [totals.get((s, status), 0) for s in starts] for status in STATUSES}
+    return starts, series
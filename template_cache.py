@@ -0,0 +1,47 @@
+import os
+
+from sqlalchemy import event
+
+from models import Template
+from response_cache import UserResponseCache
+
+# Rendered GET /templates pages and GET /templates/{id} bodies. Templates are
+# shared by every user, so all entries hang off one version (TEMPLATES) that is
+# bumped after any commit creating, updating or deleting a template; each list
+# page is keyed by its query string. Templates change rarely, hence the longer
+# TTL, which only bounds how long another worker's edits can go unseen.
+TEMPLATE_CACHE_TTL = float(os.getenv("TEMPLATE_CACHE_TTL", "300"))  # seconds
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "1000"))
+TEMPLATES = "templates"
+
+
+def new_template_cache():
+    return UserResponseCache(ttl=TEMPLATE_CACHE_TTL, max_entries=TEMPLATE_CACHE_MAX_ENTRIES)
+
+
+def list_key(request):
+    """Cache key of a list page: its query parameters in a canonical order"""
+    return "list?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+
+def item_key(template_id):
+    return f"template:{template_id}"
+
+
+def register_invalidation_listeners(cache, target):
+    """Bump the templates version after a commit that added, changed or removed a template"""
+
+    def after_flush(session, flush_context):
+        if any(isinstance(obj, Template) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+            session.info["templates_changed"] = True
+
+    def after_commit(session):
+        if session.info.pop("templates_changed", False):
+            cache.bump([TEMPLATES])
+
+    def after_rollback(session):
+        session.info.pop("templates_changed", None)
+
+    event.listen(target, "after_flush", after_flush)
+    event.listen(target, "after_commit", after_commit)
+    event.listen(target, "after_rollback", after_rollback)
@@ -39,6 +39,10 @@ def test_advanced_validation():
         # Invalid domains
         "test@nonexistentdomain12345.com",
         "user@invalid-domain-test.com",
+
+        # Domain typos of major providers
+        "john@gmial.com",
+        "jane@outlok.com",
     ]
 
     print("ADVANCED EMAIL VALIDATION FEATURES TEST")
@@ -131,6 +135,12 @@ def test_advanced_validation():
     for r in invalid_format:
         print(f"   - {r['email']}: {r['reason']}")
 
+    # Check for domain typo suggestions
+    typo_detected = [r for r in results if r.get("suggestion")]
+    print(f"Domain typos detected: {len(typo_detected)}")
+    for r in typo_detected:
+        print(f"   - {r['email']}: {r['reason']} (did you mean {r['suggestion']}?)")
+
     # Check for valid emails
     valid_emails = [r for r in results if r["valid"] and "Invalid" not in r.get("reason", "")]
     print(f"Valid emails accepted: {len(valid_emails)}")
@@ -158,6 +168,8 @@ def test_advanced_validation():
     print("  - test@spamtrap.com, user@spamcop.net")
     print("Should be INVALID (Format/Domain):")
     print("  - invalid-email, @domain.com, test@.com, test@nonexistentdomain12345.com, user@invalid-domain-test.com")
+    print("Should carry a suggestion (INVALID as a typo when the domain has no MX):")
+    print("  - john@gmial.com -> john@gmail.com, jane@outlok.com -> jane@outlook.com")
 
     print()
     print("SUMMARY:")
@@ -167,6 +179,7 @@ def test_advanced_validation():
     print(f"   - Role-based email detection: {'YES' if role_based_detected else 'NO'}")
     print(f"   - Spam trap detection: {'YES' if spam_trap_detected else 'NO'}")
     print(f"   - Invalid format detection: {'YES' if invalid_format else 'NO'}")
+    print(f"   - Domain typo suggestions: {'YES' if typo_detected else 'NO'}")
     print(f"   - Valid email acceptance: {'YES' if valid_emails else 'NO'}")
     print()
     print("ADVANCED EMAIL VALIDATION SYSTEM COMPLETE!")
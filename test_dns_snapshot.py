@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+DNS Snapshot Test (save / load of the warm-start domain cache, no network needed)
+"""
+
+import os
+import gzip
+import time
+import tempfile
+import threading
+
+from dns_snapshot import save_snapshot, load_snapshot
+
+
+def sample_caches(count=200):
+    now = time.monotonic()
+    dns_cache = {f"d{i}.test": (f"mx.d{i}.test", now) for i in range(count)}
+    catch_all_cache = {f"d{i}.test": (i % 2 == 0, now) for i in range(count)}
+    domain_hits = {f"d{i}.test": i for i in range(count)}
+    return dns_cache, catch_all_cache, domain_hits
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.json.gz")
+        assert save_snapshot(path, *sample_caches(), max_domains=50) == 50
+
+        dns_entries, catch_all_entries, hits = load_snapshot(path, ttl=3600)
+
+        assert len(dns_entries) == 50 and dns_entries["d199.test"][0] == "mx.d199.test"
+        assert catch_all_entries["d198.test"][0] is True
+        assert hits["d150.test"] == 150
+
+
+def test_truncated_snapshot_loads_as_cold_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.json.gz")
+        save_snapshot(path, *sample_caches())
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:len(data) // 2])
+
+        assert load_snapshot(path, ttl=3600) == ({}, {}, {})
+
+
+def test_garbage_snapshot_loads_as_cold_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.json.gz")
+        with gzip.open(path, "wt") as f:
+            f.write('{"version": 1, "rows": [["only-a-domain"]]}')
+
+        assert load_snapshot(path, ttl=3600) == ({}, {}, {})
+
+
+def test_concurrent_saves_leave_a_readable_snapshot():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.json.gz")
+        caches = sample_caches(2000)
+        threads = [threading.Thread(target=save_snapshot, args=(path, *caches)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        dns_entries, _, _ = load_snapshot(path, ttl=3600)
+        assert len(dns_entries) == 2000
+        assert os.listdir(tmp) == ["snapshot.json.gz"]  # no temp files left behind
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_truncated_snapshot_loads_as_cold_cache()
+    test_garbage_snapshot_loads_as_cold_cache()
+    test_concurrent_saves_leave_a_readable_snapshot()
+    print("All DNS snapshot tests passed")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Hedged DNS Resolver Test (runs against local fake resolvers, no network needed)
+"""
+
+import socket
+import threading
+import time
+import asyncio
+
+import dns.message
+import dns.rcode
+import dns.rrset
+
+from dns_resolvers import HedgedResolver
+
+
+class FakeResolver:
+    """Tiny UDP DNS server that answers every MX query after a fixed delay"""
+
+    def __init__(self, mx_host, delay=0.0):
+        self.mx_host = mx_host
+        self.delay = delay
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.address = f"127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            data, peer = self.sock.recvfrom(4096)
+            self.queries += 1
+            threading.Thread(target=self._answer, args=(data, peer), daemon=True).start()
+
+    def _answer(self, data, peer):
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        name = query.question[0].name
+        if str(name).startswith("nxdomain."):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            response.answer.append(dns.rrset.from_text(name, 300, "IN", "MX", f"10 {self.mx_host}"))
+        time.sleep(self.delay)
+        self.sock.sendto(response.to_wire(), peer)
+
+
+def test_fast_primary_answers_without_hedging():
+    fast = FakeResolver("mx.fast.test.")
+    resolver = HedgedResolver([fast.address], max_delay=0.5)
+
+    result = asyncio.run(resolver.resolve_mx("example.test"))
+
+    assert result == "mx.fast.test."
+    assert resolver.hedged_queries == 0
+
+
+def test_slow_primary_is_hedged_to_second_resolver():
+    slow = FakeResolver("mx.slow.test.", delay=1.5)
+    fast = FakeResolver("mx.fast.test.")
+    resolver = HedgedResolver([slow.address, fast.address], min_delay=0.05, max_delay=0.1)
+
+    async def timed_lookup():
+        # Timed inside the loop: asyncio.run() also waits for the slow thread on exit
+        started = time.perf_counter()
+        result = await resolver.resolve_mx("example.test")
+        return result, time.perf_counter() - started
+
+    result, elapsed = asyncio.run(timed_lookup())
+
+    assert result == "mx.fast.test."
+    assert elapsed < 1.0, f"hedged lookup took {elapsed:.2f}s"
+    assert resolver.hedged_queries == 1
+    stats = {s["resolver"]: s for s in resolver.stats()["resolvers"]}
+    assert stats[fast.address]["hedges_won"] == 1
+
+
+def test_nxdomain_is_a_negative_answer():
+    fast = FakeResolver("mx.fast.test.")
+    resolver = HedgedResolver([fast.address])
+
+    assert asyncio.run(resolver.resolve_mx("nxdomain.example.test")) is None
+    assert resolver.stats()["resolvers"][0]["negative"] == 1
+
+
+if __name__ == "__main__":
+    test_fast_primary_answers_without_hedging()
+    test_slow_primary_is_hedged_to_second_resolver()
+    test_nxdomain_is_a_negative_answer()
+    print("All hedged DNS tests passed")
@@ -0,0 +1,95 @@
+import threading
+from itertools import combinations
+
+# Symmetric-delete index for "did you mean" domain suggestions (gmial.com -> gmail.com).
+# Every indexed domain is stored under all strings reachable by deleting up to
+# max_distance characters; a lookup generates the same deletes for the input and
+# only verifies the handful of candidates that share one.
+
+
+def _deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    results = {word}
+    for distance in range(1, min(max_distance, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), distance):
+            results.add("".join(c for i, c in enumerate(word) if i not in positions))
+    return results
+
+
+def edit_distance(a, b):
+    """Optimal string alignment distance (Levenshtein plus adjacent transpositions)"""
+    if a == b:
+        return 0
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class DomainTypoIndex:
+    """Edit-distance index over known-good domains
+
+    known holds real domains that are never reported as typos (mail.com is not
+    a misspelt gmail.com) without becoming suggestion targets themselves.
+    """
+
+    def __init__(self, domains=(), max_distance=2, known=()):
+        self.max_distance = max_distance
+        self._domains = set()
+        self._known = {domain.lower() for domain in known}
+        self._deletes = {}
+        self._lock = threading.Lock()
+        for domain in domains:
+            self.add(domain)
+
+    def __contains__(self, domain):
+        return domain in self._domains or domain in self._known
+
+    def __len__(self):
+        return len(self._domains)
+
+    def allowed_distance(self, domain):
+        """Short names get a tighter budget, otherwise most short domains would look like typos"""
+        label = domain.split(".")[0]
+        if len(label) < 5:
+            return 0
+        if len(label) < 8:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def add(self, domain):
+        domain = domain.lower()
+        with self._lock:
+            if domain in self._domains:
+                return
+            self._domains.add(domain)
+            for key in _deletes(domain, self.max_distance):
+                self._deletes.setdefault(key, set()).add(domain)
+
+    def suggest(self, domain):
+        """Closest indexed domain within the allowed distance, or None"""
+        domain = domain.lower()
+        if domain in self:
+            return None
+
+        candidates = set()
+        with self._lock:
+            for key in _deletes(domain, self.max_distance):
+                candidates.update(self._deletes.get(key, ()))
+
+        best, best_rank = None, None
+        for candidate in candidates:
+            distance = edit_distance(domain, candidate)
+            if distance > self.allowed_distance(candidate):
+                continue
+            # Ties go to .com, the far more common intent (yahoo.co -> yahoo.com)
+            rank = (distance, not candidate.endswith(".com"), candidate)
+            if best is None or rank < best_rank:
+                best, best_rank = candidate, rank
+        return best
@@ -0,0 +1,73 @@
+import threading
+
+from fast_json import dumps as _dumps, FastJSONResponse
+
+# Compact in-process representation of email validation results. Large batches
+# used to build one pydantic model per address and then re-validate them all
+# through response_model; records here are plain __slots__ objects with the
+# reason interned as a small integer code, and the response is encoded directly.
+
+RESULT_CHUNK_SIZE = 500  # records encoded per orjson call
+
+_reasons = []
+_reason_codes = {}
+_reasons_lock = threading.Lock()
+
+
+def reason_code(reason):
+    """Intern a reason string and return its integer code"""
+    code = _reason_codes.get(reason)
+    if code is None:
+        with _reasons_lock:
+            code = _reason_codes.get(reason)
+            if code is None:
+                code = len(_reasons)
+                _reasons.append(reason)
+                _reason_codes[reason] = code
+    return code
+
+
+def reason_text(code):
+    return _reasons[code]
+
+
+class ValidationRecord:
+    """One validation result; field names match schemas.EmailValidationResult"""
+
+    __slots__ = ("email", "valid", "deliverable", "reason_code", "suggestion")
+
+    def __init__(self, email, valid, deliverable=False, reason=None, suggestion=None):
+        self.email = email
+        self.valid = valid
+        self.deliverable = deliverable
+        self.reason_code = reason_code(reason)
+        self.suggestion = suggestion
+
+    @property
+    def reason(self):
+        return _reasons[self.reason_code]
+
+    def as_dict(self):
+        return {
+            "email": self.email,
+            "valid": self.valid,
+            "deliverable": self.deliverable,
+            "reason": _reasons[self.reason_code],
+            "suggestion": self.suggestion,
+        }
+
+
+def iter_results_json(records, chunk_size=RESULT_CHUNK_SIZE):
+    """Encode {"results": [...]} chunk by chunk so only one chunk of dicts exists at a time"""
+    yield b'{"results":['
+    for start in range(0, len(records), chunk_size):
+        if start:
+            yield b","
+        chunk = _dumps([r.as_dict() for r in records[start:start + chunk_size]])
+        yield chunk[1:-1]  # strip the enclosing brackets
+    yield b"]}"
+
+
+def validation_response(records):
+    """JSON response for a list of ValidationRecords (GZipMiddleware compresses it)"""
+    return FastJSONResponse(content=b"".join(iter_results_json(records)))
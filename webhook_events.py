@@ -0,0 +1,290 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import select, update, bindparam, values, column, Integer, String, DateTime, or_
+
+from models import EmailLog, EmailSuppression
+from rollups import log_deltas, apply_rollup_deltas, counter_deltas, apply_counter_deltas, campaign_owners
+
+# SendGrid Event Webhook ingestion. The endpoint only verifies the signature
+# and queues the decoded events; EventIngestor applies them in batches: one
+# SELECT of the affected email_logs rows, one bulk UPDATE ... FROM (VALUES ...)
+# on PostgreSQL (executemany on SQLite), suppression upserts, and explicit
+# rollup / campaign counter deltas, since bulk updates bypass the ORM hooks.
+#
+# Events are checked for the expected field types when they are accepted. A
+# batch that still fails is retried WEBHOOK_MAX_ATTEMPTS times, then split in
+# halves to isolate the failing events, and a single event that keeps failing
+# is moved to EventIngestor.dead_letters instead of blocking the queue.
+#
+# The queue is in memory only: events acknowledged with 200 but not yet applied
+# are lost if the process dies without its shutdown flush (SendGrid does not
+# redeliver acknowledged events). WEBHOOK_FLUSH_INTERVAL bounds that window.
+
+SENDGRID_WEBHOOK_PUBLIC_KEY = os.getenv("SENDGRID_WEBHOOK_PUBLIC_KEY")  # "Verification Key" from Mail Settings
+SIGNATURE_HEADER = "X-Twilio-Email-Event-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Twilio-Email-Event-Webhook-Timestamp"
+WEBHOOK_MAX_AGE = int(os.getenv("WEBHOOK_MAX_AGE", "600"))  # seconds; older signed timestamps are replays
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "2000"))
+WEBHOOK_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_FLUSH_INTERVAL", "0.5"))  # seconds
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "200000"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "3"))  # failed tries before a batch is split / dropped
+WEBHOOK_DEAD_LETTER_MAX = int(os.getenv("WEBHOOK_DEAD_LETTER_MAX", "10000"))  # dropped events kept for inspection
+
+# SendGrid event -> EmailLog.status
+EVENT_STATUS = {
+    "delivered": "sent",
+    "bounce": "bounced",
+    "blocked": "bounced",
+    "dropped": "failed",
+}
+# Events that put the recipient on the suppression list
+SUPPRESSION_EVENTS = {"bounce", "dropped", "spamreport", "unsubscribe", "group_unsubscribe"}
+# A bounce or drop is final; a late "delivered" must not turn it back into "sent"
+FINAL_STATUSES = {"bounced", "failed"}
+
+email_logs = EmailLog.__table__
+suppressions = EmailSuppression.__table__
+
+_verifier = None
+
+
+def verify_signature(body, signature, timestamp, public_key=SENDGRID_WEBHOOK_PUBLIC_KEY):
+    """Check SendGrid's ECDSA signature over timestamp + raw body"""
+    global _verifier
+    if not signature or not timestamp:
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > WEBHOOK_MAX_AGE:
+            return False
+    except ValueError:
+        return False
+    if _verifier is None:
+        from sendgrid.helpers.eventwebhook import EventWebhook
+        _verifier = EventWebhook(public_key)
+    try:
+        return _verifier.verify_signature(body.decode("utf-8"), signature, timestamp)
+    except Exception:
+        return False  # Malformed base64 / DER signature
+
+
+def _is_text(value):
+    return isinstance(value, str) and "\x00" not in value  # PostgreSQL text cannot hold NUL
+
+
+def valid_event(event):
+    """Field types apply_events relies on; anything else is rejected when the webhook is received"""
+    if not isinstance(event, dict) or not _is_text(event.get("event")):
+        return False
+    for field in ("email", "sg_message_id"):
+        if event.get(field) is not None and not _is_text(event[field]):
+            return False
+    for field in ("timestamp", "email_log_id"):
+        value = event.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, str))):
+            return False
+    return True
+
+
+def _message_id(event):
+    # sg_message_id is "<X-Message-Id>.filter..."; the log stores the X-Message-Id part
+    sg_message_id = event.get("sg_message_id") or ""
+    return sg_message_id.split(".", 1)[0] or None
+
+
+def _log_id(event):
+    # Custom args are echoed at the top level of each event
+    try:
+        log_id = int(event.get("email_log_id"))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return log_id if 0 < log_id < 2 ** 31 else None  # INTEGER column
+
+
+def _timestamp(event):
+    try:
+        return float(event.get("timestamp") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def upsert_suppressions(connection, rows):
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        connection.execute(insert(suppressions).on_conflict_do_nothing(index_elements=["email"]), rows)
+        return
+    existing = set(connection.execute(
+        select(suppressions.c.email).where(suppressions.c.email.in_([r["email"] for r in rows]))
+    ).scalars())
+    new_rows = [r for r in rows if r["email"] not in existing]
+    if new_rows:
+        connection.execute(suppressions.insert(), new_rows)
+
+
+def _bulk_set_status(connection, rows):
+    """rows: [(id, sent_at, status)]"""
+    if connection.dialect.name == "postgresql":
+        data = values(
+            column("id", Integer), column("sent_at", DateTime), column("status", String), name="v"
+        ).data(rows)
+        # sent_at in the join lets PostgreSQL prune to the partitions holding these rows
+        connection.execute(
+            update(email_logs)
+            .where(email_logs.c.id == data.c.id, email_logs.c.sent_at == data.c.sent_at)
+            .values(status=data.c.status)
+        )
+        return
+    stmt = update(email_logs).where(email_logs.c.id == bindparam("b_id")).values(status=bindparam("b_status"))
+    connection.execute(stmt, [{"b_id": log_id, "b_status": status} for log_id, _, status in rows])
+
+
+def apply_events(connection, events):
+    """Apply a batch of SendGrid events; returns the user ids whose analytics changed"""
+    events = sorted(events, key=_timestamp)
+    now = datetime.utcnow()
+
+    suppressed = {}
+    for event in events:
+        email = (event.get("email") or "").strip().lower()
+        if email and event.get("event") in SUPPRESSION_EVENTS:
+            suppressed.setdefault(email, {"email": email, "reason": event["event"], "created_at": now})
+    upsert_suppressions(connection, list(suppressed.values()))
+
+    status_events = [e for e in events if e.get("event") in EVENT_STATUS]
+    message_ids = {_message_id(e) for e in status_events} - {None}
+    log_ids = {_log_id(e) for e in status_events} - {None}
+    if not message_ids and not log_ids:
+        return set()
+
+    conditions = []
+    if message_ids:
+        conditions.append(email_logs.c.message_id.in_(message_ids))
+    if log_ids:
+        conditions.append(email_logs.c.id.in_(log_ids))
+    query = select(email_logs.c.id, email_logs.c.user_id, email_logs.c.campaign_id, email_logs.c.sent_at,
+                   email_logs.c.status, email_logs.c.message_id).where(or_(*conditions))
+    if connection.dialect.name == "postgresql":
+        query = query.with_for_update()  # Serialize with concurrent batches touching the same rows
+    logs = connection.execute(query).all()
+    by_message = {log.message_id: log for log in logs if log.message_id}
+    by_id = {log.id: log for log in logs}
+
+    # Final status per log after replaying its events in timestamp order
+    final = {log.id: log.status for log in logs}
+    for event in status_events:
+        log = by_id.get(_log_id(event)) or by_message.get(_message_id(event))
+        if log is None or final[log.id] in FINAL_STATUSES:
+            continue
+        final[log.id] = EVENT_STATUS[event["event"]]
+
+    changed = [log for log in logs if final[log.id] != log.status]
+    if not changed:
+        return set()
+    _bulk_set_status(connection, [(log.id, log.sent_at, final[log.id]) for log in changed])
+
+    # Bulk updates bypass the ORM flush hooks, so move the rollup and counters here
+    changes = []
+    for log in changed:
+        changes.append((log, log.status, -1))
+        changes.append((log, final[log.id], 1))
+    apply_rollup_deltas(connection, log_deltas(connection, changes))
+    apply_counter_deltas(connection, counter_deltas(changes), event_at=now)
+
+    owners = {log.user_id for log in changed}
+    owners.update(campaign_owners(connection, {log.campaign_id for log in changed if log.campaign_id}).values())
+    owners.discard(None)
+    return owners
+
+
+class EventIngestor:
+    """In-memory queue of webhook events, applied in batches by a background task"""
+
+    def __init__(self, engine, on_applied=None, batch_size=WEBHOOK_BATCH_SIZE,
+                 flush_interval=WEBHOOK_FLUSH_INTERVAL, max_queued=WEBHOOK_QUEUE_MAX,
+                 max_attempts=WEBHOOK_MAX_ATTEMPTS, dead_letter_max=WEBHOOK_DEAD_LETTER_MAX):
+        self.engine = engine
+        self.on_applied = on_applied  # called with the affected user ids after each commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._queue = deque()
+        self._retry = deque()  # (batch, failed attempts), retried before newer events
+        self._lock = threading.Lock()  # one batch at a time (background task or shutdown flush)
+        self.dead_letters = deque(maxlen=dead_letter_max)
+        self.applied = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+
+    def queued(self):
+        return len(self._queue) + sum(len(batch) for batch, _ in list(self._retry))
+
+    def enqueue(self, events):
+        """Queue a webhook payload; False when full so the endpoint can ask SendGrid to retry"""
+        if len(self._queue) + len(events) > self.max_queued:
+            return False
+        self._queue.extend(events)
+        return True
+
+    def flush_batch(self):
+        """Apply up to batch_size queued events in one transaction; returns how many were taken"""
+        with self._lock:
+            if self._retry:
+                batch, attempts = self._retry.popleft()
+            else:
+                batch, attempts = [], 0
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+            if not batch:
+                return 0
+            try:
+                with self.engine.begin() as connection:
+                    owners = apply_events(connection, batch)
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"Webhook event batch of {len(batch)} failed (attempt {attempts + 1}): {e}")
+                self._requeue_failed(batch, attempts + 1)
+                raise
+            self.applied += len(batch)
+            if owners and self.on_applied:
+                self.on_applied(owners)
+            return len(batch)
+
+    def _requeue_failed(self, batch, attempts):
+        if attempts < self.max_attempts:
+            self._retry.appendleft((batch, attempts))
+        elif len(batch) > 1:
+            # Retry each half on its own so the events that keep failing end up alone
+            half = len(batch) // 2
+            self._retry.extendleft([(batch[half:], 0), (batch[:half], 0)])
+        else:
+            self.dead_letters.append(batch[0])
+            self.dead_lettered += 1
+            print(f"Webhook event dropped after {attempts} attempts: {batch[0]!r}")
+
+    def flush_all(self):
+        while self.flush_batch():
+            pass
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                taken = await loop.run_in_executor(None, self.flush_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                taken = 0
+            # Keep draining while batches are full; otherwise wait for more events
+            if taken < self.batch_size:
+                await asyncio.sleep(self.flush_interval)